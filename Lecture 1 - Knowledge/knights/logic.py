@@ -84,13 +84,13 @@ class Not(Sentence):
         return f"Not({self.operand})"
 
     def evaluate(self, model):
-        return not self.operand.evaluate(model)
+        return _evaluate(self, model)
 
     def formula(self):
-        return "¬" + Sentence.parenthesize(self.operand.formula())
+        return _formula(self)
 
     def symbols(self):
-        return self.operand.symbols()
+        return _symbols(self)
 
 
 class And(Sentence):
@@ -118,16 +118,13 @@ class And(Sentence):
         self.conjuncts.append(conjunct)
 
     def evaluate(self, model):
-        return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
+        return _evaluate(self, model)
 
     def formula(self):
-        if len(self.conjuncts) == 1:
-            return self.conjuncts[0].formula()
-        return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
-                           for conjunct in self.conjuncts])
+        return _formula(self)
 
     def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+        return _symbols(self)
 
 
 class Or(Sentence):
@@ -149,16 +146,13 @@ class Or(Sentence):
         return f"Or({disjuncts})"
 
     def evaluate(self, model):
-        return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
+        return _evaluate(self, model)
 
     def formula(self):
-        if len(self.disjuncts) == 1:
-            return self.disjuncts[0].formula()
-        return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
-                            for disjunct in self.disjuncts])
+        return _formula(self)
 
     def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+        return _symbols(self)
 
 
 class Implication(Sentence):
@@ -180,16 +174,13 @@ class Implication(Sentence):
         return f"Implication({self.antecedent}, {self.consequent})"
 
     def evaluate(self, model):
-        return ((not self.antecedent.evaluate(model))
-                or self.consequent.evaluate(model))
+        return _evaluate(self, model)
 
     def formula(self):
-        antecedent = Sentence.parenthesize(self.antecedent.formula())
-        consequent = Sentence.parenthesize(self.consequent.formula())
-        return f"{antecedent} => {consequent}"
+        return _formula(self)
 
     def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+        return _symbols(self)
 
 
 class Biconditional(Sentence):
@@ -211,53 +202,665 @@ class Biconditional(Sentence):
         return f"Biconditional({self.left}, {self.right})"
 
     def evaluate(self, model):
-        return ((self.left.evaluate(model)
-                 and self.right.evaluate(model))
-                or (not self.left.evaluate(model)
-                    and not self.right.evaluate(model)))
+        return _evaluate(self, model)
 
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
-        return f"{left} <=> {right}"
+        return _formula(self)
 
     def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
+        return _symbols(self)
 
 
 def model_check(knowledge, query):
     """Checks if knowledge base entails query."""
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
-
-        # If model has an assignment for each symbol
-        if not symbols:
-
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
-
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
-
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
-
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
-
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
-
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
-
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+
+    # Check every assignment of the symbols in turn
+    for values in itertools.product((True, False), repeat=len(symbols)):
+        model = dict(zip(symbols, values))
+
+        # If knowledge base is true in model, then query must also be true
+        if knowledge.evaluate(model) and not query.evaluate(model):
+            return False
+    return True
+
+
+def _evaluate(sentence, model):
+    """Evaluates a sentence using an explicit stack instead of recursion."""
+
+    # Each frame holds a sentence, its operands, the operand being
+    # evaluated, and the value of the left side of a biconditional
+    stack = []
+    node = sentence
+    while True:
+
+        # Descend through first operands until reaching a symbol
+        kind = type(node)
+        while kind is not Symbol:
+            if kind not in CONNECTIVES:
+                kind = next((connective for connective in CONNECTIVES
+                             if isinstance(node, connective)), None)
+                if kind is None:
+                    break
+            children = operands(node)
+            if not children:
+                break
+            stack.append([kind, children, 0, None])
+            node = children[0]
+            kind = type(node)
+
+        # Only empty conjunctions and disjunctions have no operands
+        if kind is Symbol or kind is None:
+            value = node.evaluate(model)
+        else:
+            value = kind is And
+
+        # Pass the value up to the sentences waiting for it
+        while stack:
+            frame = stack[-1]
+            kind, children, index, left = frame
+            if kind is And:
+                done = not value or index == len(children) - 1
+            elif kind is Or:
+                done = value or index == len(children) - 1
+            elif kind is Not:
+                value = not value
+                done = True
+            elif kind is Implication:
+
+                # A false antecedent makes the implication true
+                done = index == 1 or not value
+                if index == 0:
+                    value = True
+            else:
+                if index == 0:
+                    frame[3] = value
+                else:
+                    value = left == value
+                done = index == 1
+            if done:
+                stack.pop()
+                continue
+
+            # Symbols are evaluated in place, other operands are descended into
+            frame[2] = index + 1
+            node = children[index + 1]
+            if type(node) is not Symbol:
+                break
+            value = node.evaluate(model)
+        else:
+            return value
+
+
+def _formula(sentence):
+    """Returns the formula of a sentence without recursion."""
+
+    # Pieces of the formula are emitted left to right and joined once,
+    # so long formulas are not copied again at every level of nesting
+    pieces = []
+    stack = [(sentence, False)]
+    while stack:
+        node, wrap = stack.pop()
+        if isinstance(node, str):
+            pieces.append(node)
+            continue
+        if isinstance(node, Symbol):
+            pieces.append(Sentence.parenthesize(node.name) if wrap
+                          else node.name)
+            continue
+        children = operands(node)
+        if not children and not isinstance(node, (And, Or)):
+            formula = node.formula()
+            pieces.append(Sentence.parenthesize(formula) if wrap else formula)
+            continue
+
+        # Single operands and empty formulas are never parenthesized
+        if isinstance(node, (And, Or)) and len(children) <= 1:
+            stack.extend((child, wrap) for child in children)
+            continue
+
+        if isinstance(node, Not):
+            separator = None
+            pending = ["¬", children[0]]
+        else:
+            if isinstance(node, And):
+                separator = " ∧ "
+            elif isinstance(node, Or):
+                separator = " ∨  "
+            elif isinstance(node, Implication):
+                separator = " => "
+            else:
+                separator = " <=> "
+            pending = [children[0]]
+            for child in children[1:]:
+                pending.extend([separator, child])
+        if wrap:
+            pending = ["("] + pending + [")"]
+        stack.extend(
+            (item, True) for item in reversed(pending)
+        )
+    return "".join(pieces)
+
+
+def _symbols(sentence):
+    """Returns the set of symbols in a sentence without recursion."""
+    symbols = set()
+
+    # Shared operands only need to be visited once
+    seen = set()
+    stack = [sentence]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, Symbol):
+            symbols.add(node.name)
+        elif operands(node) or isinstance(node, (And, Or)):
+            stack.extend(operands(node))
+        else:
+            symbols |= node.symbols()
+    return symbols
+
+
+class KnowledgeBase():
+    """Knowledge base that keeps its satisfying models between queries."""
+
+    def __init__(self, *sentences):
+        self.sentences = []
+        self.symbols = set()
+        # A knowledge base with no sentences is satisfied by the empty model
+        self.models = [dict()]
+        self.explored = 0
+        self.entailed = dict()
+        for sentence in sentences:
+            self.add(sentence)
+
+    def add(self, sentence):
+        """Adds a conjunct, filtering the models found so far."""
+        Sentence.validate(sentence)
+        self.sentences.append(sentence)
+
+        # Only symbols not seen before need to be enumerated
+        new = sorted(sentence.symbols() - self.symbols)
+        self.symbols.update(new)
+        models = []
+        for model in self.models:
+            for values in itertools.product((True, False), repeat=len(new)):
+                extended = model.copy()
+                extended.update(zip(new, values))
+                self.explored += 1
+                if sentence.evaluate(extended):
+                    models.append(extended)
+        self.models = models
+
+        # Previous answers may no longer hold with fewer models
+        self.entailed.clear()
+
+    def satisfiable(self):
+        """Checks if any model satisfies the knowledge base."""
+        return len(self.models) > 0
+
+    def entails(self, query):
+        """Checks if knowledge base entails query."""
+        if query in self.entailed:
+            return self.entailed[query]
+
+        # Symbols unknown to the knowledge base may take any value
+        new = sorted(query.symbols() - self.symbols)
+        result = True
+        for model in self.models:
+            for values in itertools.product((True, False), repeat=len(new)):
+                extended = model.copy()
+                extended.update(zip(new, values))
+                self.explored += 1
+                if not query.evaluate(extended):
+                    result = False
+                    break
+            if not result:
+                break
+
+        self.entailed[query] = result
+        return result
+
+
+CONNECTIVES = (Not, And, Or, Implication, Biconditional)
+
+
+def operands(sentence):
+    """Returns the list of sentences directly inside a logical sentence."""
+    if isinstance(sentence, Not):
+        return [sentence.operand]
+    if isinstance(sentence, And):
+        return sentence.conjuncts
+    if isinstance(sentence, Or):
+        return sentence.disjuncts
+    if isinstance(sentence, Implication):
+        return [sentence.antecedent, sentence.consequent]
+    if isinstance(sentence, Biconditional):
+        return [sentence.left, sentence.right]
+    return []
+
+
+class CNF():
+    """Conjunctive normal form of sentences, with integer literals."""
+
+    def __init__(self, *sentences):
+        self.clauses = []
+        self.variables = dict()
+        self.num_variables = 0
+        for sentence in sentences:
+            self.add(sentence)
+
+    def variable(self, name=None):
+        """Returns the variable for a symbol name, or a fresh one."""
+        if name is not None and name in self.variables:
+            return self.variables[name]
+        self.num_variables += 1
+        if name is not None:
+            self.variables[name] = self.num_variables
+        return self.num_variables
+
+    def add(self, sentence):
+        """Adds a sentence using the Tseitin transformation."""
+        Sentence.validate(sentence)
+
+        # Conjuncts at the top level are asserted as clauses of their own
+        pending = [sentence]
+        while pending:
+            sentence = pending.pop()
+            if isinstance(sentence, And):
+                pending.extend(reversed(sentence.conjuncts))
+            elif isinstance(sentence, Or):
+                self.clauses.append(tuple(
+                    self.literal(disjunct) for disjunct in sentence.disjuncts
+                ))
+            else:
+                self.clauses.append((self.literal(sentence),))
+
+    def literal(self, sentence):
+        """Returns a literal equivalent to a sentence, adding its clauses."""
+
+        # Literals of sentences already encoded, keyed by object identity
+        literals = dict()
+
+        # Visit operands before the sentence containing them
+        stack = [(sentence, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in literals:
+                continue
+            if isinstance(node, Symbol):
+                literals[id(node)] = self.variable(node.name)
+                continue
+            children = operands(node)
+            if not children and not isinstance(node, (And, Or)):
+                raise TypeError(f"cannot convert {node!r} to CNF")
+            if not expanded:
+                stack.append((node, True))
+                for child in reversed(children):
+                    if id(child) not in literals:
+                        stack.append((child, False))
+                continue
+            values = [literals[id(child)] for child in children]
+            literals[id(node)] = self.gate(node, values)
+
+        return literals[id(sentence)]
+
+    def sentence(self):
+        """Returns a logical sentence equivalent to the clauses."""
+        names = {variable: name for name, variable in self.variables.items()}
+        symbols = dict()
+
+        def literal(value):
+            variable = abs(value)
+            if variable not in symbols:
+                symbols[variable] = Symbol(names.get(variable, f"x{variable}"))
+            symbol = symbols[variable]
+            return symbol if value > 0 else Not(symbol)
+
+        return And(*[
+            Or(*[literal(value) for value in clause])
+            for clause in self.clauses
+        ])
+
+    def gate(self, sentence, values):
+        """Returns a literal defined by clauses equivalent to a connective."""
+        if isinstance(sentence, Not):
+            return -values[0]
+        if isinstance(sentence, Implication):
+            return self.gate(Or(), [-values[0], values[1]])
+        if isinstance(sentence, Biconditional):
+            left, right = values
+            x = self.variable()
+            self.clauses.extend([
+                (-x, -left, right), (-x, left, -right),
+                (x, left, right), (x, -left, -right),
+            ])
+            return x
+
+        # A single operand needs no new variable
+        if len(values) == 1:
+            return values[0]
+        x = self.variable()
+        if isinstance(sentence, And):
+            self.clauses.extend((-x, value) for value in values)
+            self.clauses.append((x,) + tuple(-value for value in values))
+        else:
+            self.clauses.extend((x, -value) for value in values)
+            self.clauses.append((-x,) + tuple(values))
+        return x
+
+
+class ModelCounter():
+    """Counts models of a knowledge base using component decomposition."""
+
+    def __init__(self, knowledge):
+        self.cnf = knowledge if isinstance(knowledge, CNF) else CNF(knowledge)
+        self.cache = dict()
+        self.decisions = 0
+
+        # Only variables standing for symbols are tracked for marginals
+        self.inputs = set(self.cnf.variables.values())
+
+        # Drop repeated literals and clauses that are always true
+        self.clauses = []
+        for clause in self.cnf.clauses:
+            clause = frozenset(clause)
+            if not any(-literal in clause for literal in clause):
+                self.clauses.append(clause)
+
+    def count(self, *assumptions):
+        """Returns the number of models in which all assumptions hold."""
+        return self.solve(assumptions)[0]
+
+    def marginals(self):
+        """Returns the fraction of models in which each symbol is true."""
+        total, trues = self.solve(())
+        if total == 0:
+            raise Exception("knowledge base has no models")
+        return {
+            name: trues[variable] / total
+            for name, variable in sorted(self.cnf.variables.items())
+        }
+
+    def solve(self, assumptions):
+        """Returns the model count and per-symbol true counts."""
+        assumed = set()
+        for assumption in assumptions:
+            negated = isinstance(assumption, Not)
+            symbol = assumption.operand if negated else assumption
+            if not isinstance(symbol, Symbol):
+                raise TypeError("assumptions must be symbols or their negation")
+            if symbol.name not in self.cnf.variables:
+                raise Exception(f"variable {symbol.name} not in knowledge base")
+            variable = self.cnf.variables[symbol.name]
+            assumed.add(-variable if negated else variable)
+        if any(-literal in assumed for literal in assumed):
+            return 0, dict.fromkeys(self.inputs, 0)
+
+        # An empty clause, such as one read from DIMACS, is never satisfied
+        clauses = self.condition(self.clauses, assumed)
+        if clauses is None or not all(clauses):
+            return 0, dict.fromkeys(self.inputs, 0)
+
+        # Run the search with an explicit stack of pending subproblems
+        stack = [self.count_clauses(clauses)]
+        result = None
+        while stack:
+            try:
+                subproblem = stack[-1].send(result)
+            except StopIteration as stop:
+                stack.pop()
+                result = stop.value
+            else:
+                stack.append(self.count_clauses(subproblem))
+                result = None
+
+        if result[0] == 0:
+            return 0, dict.fromkeys(self.inputs, 0)
+
+        # Account for variables fixed by assumptions or left unconstrained
+        fixed = {abs(literal) for literal in assumed}
+        free = set(range(1, self.cnf.num_variables + 1))
+        free -= fixed | self.variables_of(clauses)
+        total, trues = self.extend(*result, free=free)
+        for variable in fixed & self.inputs:
+            trues[variable] = total if variable in assumed else 0
+        return total, trues
+
+    def count_clauses(self, clauses):
+        """
+        Counts assignments to the variables of clauses satisfying them,
+        along with how many of those make each symbol true.
+
+        Written as a generator that yields subproblems to `solve` and
+        receives their results, so deep searches do not recurse.
+        """
+        variables = self.variables_of(clauses)
+
+        # Assign every literal that is left alone in a clause
+        forced = self.propagate(clauses)
+        if forced is None:
+            return 0, dict()
+        if forced:
+            clauses = self.condition(clauses, forced)
+
+        # Independent components multiply
+        total, trues = 1, dict()
+        for component in self.components(clauses):
+            key = frozenset(component)
+            if key not in self.cache:
+                self.cache[key] = yield from self.split(component)
+            count, counts = self.cache[key]
+            if count == 0:
+                return 0, dict()
+            trues = {
+                variable: value * count for variable, value in trues.items()
+            }
+            trues.update(
+                (variable, value * total) for variable, value in counts.items()
+            )
+            total *= count
+
+        # Forced variables take one value, vanished ones take either
+        for literal in forced:
+            if abs(literal) in self.inputs:
+                trues[abs(literal)] = total if literal > 0 else 0
+        vanished = variables - {abs(literal) for literal in forced}
+        vanished -= self.variables_of(clauses)
+        return self.extend(total, trues, free=vanished)
+
+    def split(self, clauses):
+        """Counts a connected component by branching on one variable."""
+        self.decisions += 1
+        variables = self.variables_of(clauses)
+
+        # Branch on the most frequent variable, preferring symbols
+        occurrences = dict()
+        for clause in clauses:
+            for literal in clause:
+                variable = abs(literal)
+                occurrences[variable] = occurrences.get(variable, 0) + 1
+        variable = max(occurrences, key=lambda v: (
+            v in self.inputs, occurrences[v]
+        ))
+
+        total, trues = 0, dict()
+        for literal in (variable, -variable):
+            reduced = self.condition(clauses, {literal})
+            if reduced is None:
+                continue
+            count, counts = yield reduced
+            vanished = variables - {variable} - self.variables_of(reduced)
+            count, counts = self.extend(count, counts, free=vanished)
+            if variable in self.inputs:
+                counts[variable] = count if literal > 0 else 0
+            total += count
+            for key, value in counts.items():
+                trues[key] = trues.get(key, 0) + value
+        return total, trues
+
+    def extend(self, total, trues, free):
+        """Scales counts for variables that may take either value."""
+        factor = 2 ** len(free)
+        trues = {variable: value * factor for variable, value in trues.items()}
+        total *= factor
+        for variable in free:
+            if variable in self.inputs:
+                trues[variable] = total // 2
+        return total, trues
+
+    @staticmethod
+    def propagate(clauses):
+        """Returns literals implied by unit propagation, or None on conflict."""
+        occurrences = dict()
+        for index, clause in enumerate(clauses):
+            for literal in clause:
+                occurrences.setdefault(literal, []).append(index)
+
+        forced = set()
+        satisfied = set()
+        queue = [next(iter(clause)) for clause in clauses if len(clause) == 1]
+        while queue:
+            literal = queue.pop()
+            if literal in forced:
+                continue
+            if -literal in forced:
+                return None
+            forced.add(literal)
+            satisfied.update(occurrences.get(literal, ()))
+
+            # Clauses losing a literal may now have one or none left
+            for index in occurrences.get(-literal, ()):
+                if index in satisfied:
+                    continue
+                remaining = [other for other in clauses[index]
+                             if -other not in forced]
+                if not remaining:
+                    return None
+                if len(remaining) == 1:
+                    queue.append(remaining[0])
+        return forced
+
+    @staticmethod
+    def condition(clauses, literals):
+        """Simplifies clauses given true literals, or None on conflict."""
+        negated = {-literal for literal in literals}
+        result = []
+        for clause in clauses:
+            if not clause.isdisjoint(literals):
+                continue
+            if not clause.isdisjoint(negated):
+                clause = clause - negated
+                if not clause:
+                    return None
+            result.append(clause)
+        return result
+
+    @staticmethod
+    def variables_of(clauses):
+        """Returns the set of variables appearing in clauses."""
+        return {abs(literal) for clause in clauses for literal in clause}
+
+    @staticmethod
+    def components(clauses):
+        """Splits clauses into groups that share no variables."""
+        by_variable = dict()
+        for index, clause in enumerate(clauses):
+            for literal in clause:
+                by_variable.setdefault(abs(literal), []).append(index)
+
+        seen = set()
+        components = []
+        for start in range(len(clauses)):
+            if start in seen:
+                continue
+            seen.add(start)
+            component = []
+            frontier = [start]
+            while frontier:
+                index = frontier.pop()
+                component.append(clauses[index])
+                for literal in clauses[index]:
+                    for other in by_variable[abs(literal)]:
+                        if other not in seen:
+                            seen.add(other)
+                            frontier.append(other)
+            components.append(component)
+        return components
+
+
+def model_count(knowledge):
+    """Returns the number of models of the knowledge base."""
+    return ModelCounter(knowledge).count()
+
+
+def marginals(knowledge):
+    """Returns the fraction of models in which each symbol is true."""
+    return ModelCounter(knowledge).marginals()
+
+
+def read_dimacs(filename):
+    """Reads a DIMACS CNF file, one line at a time, into a CNF."""
+    cnf = CNF()
+    names = dict()
+    clause = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            # Comments may name variables, as written by write_dimacs
+            if line.startswith("c"):
+                words = line.split(maxsplit=3)
+                if len(words) == 4 and words[1] == "var":
+                    names[int(words[2])] = words[3]
+                continue
+            if line.startswith("p"):
+                words = line.split()
+                if len(words) != 4 or words[1] != "cnf":
+                    raise ValueError(f"invalid problem line: {line}")
+                cnf.num_variables = int(words[2])
+                continue
+
+            # Some files mark the end of the clauses with a percent sign
+            if line.startswith("%"):
+                break
+
+            # Clauses end with 0 and may span several lines
+            for word in line.split():
+                value = int(word)
+                if value == 0:
+                    cnf.clauses.append(tuple(clause))
+                    clause = []
+                else:
+                    clause.append(value)
+                    cnf.num_variables = max(cnf.num_variables, abs(value))
+    if clause:
+        cnf.clauses.append(tuple(clause))
+
+    # Named variables are symbols and the rest auxiliary; with no names
+    # given, every variable is taken to be a symbol
+    if names:
+        for variable, name in names.items():
+            cnf.variables[name] = variable
+    else:
+        for variable in range(1, cnf.num_variables + 1):
+            cnf.variables[f"x{variable}"] = variable
+    return cnf
+
+
+def write_dimacs(knowledge, filename):
+    """Writes a knowledge base to a DIMACS CNF file."""
+    cnf = knowledge if isinstance(knowledge, CNF) else CNF(knowledge)
+    with open(filename, "w") as f:
+        for name, variable in sorted(cnf.variables.items(),
+                                     key=lambda item: item[1]):
+            f.write(f"c var {variable} {name}\n")
+        f.write(f"p cnf {cnf.num_variables} {len(cnf.clauses)}\n")
+        for clause in cnf.clauses:
+            f.write(" ".join(str(value) for value in clause) + " 0\n")
@@ -141,8 +141,10 @@ def main():
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
+            # Enumerate the models once and reuse them for every symbol
+            knowledgeBase = KnowledgeBase(*knowledge.conjuncts)
             for symbol in symbols:
-                if model_check(knowledge, symbol):
+                if knowledgeBase.entails(symbol):
                     print(f"    {symbol}")
 
 
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from logic import *
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Solve knights and knaves puzzles in parallel."
+    )
+    parser.add_argument("puzzles", help="JSON file of puzzles")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--engine", choices=["models", "count"],
+                        default="count",
+                        help="enumerate models, or count them by components")
+    args = parser.parse_args()
+
+    puzzles = load_puzzles(args.puzzles)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = executor.map(
+            solve, puzzles, [args.engine] * len(puzzles),
+            chunksize=max(1, len(puzzles) // (4 * (args.workers or 1)))
+        )
+        for result in results:
+            print(f"{result['name']} ({result['time']:.4f}s, "
+                  f"{result['explored']} explored, {result['models']} models)")
+            for conclusion in result["conclusions"]:
+                print(f"    {conclusion}")
+    elapsed = time.perf_counter() - start
+    print(f"Solved {len(puzzles)} puzzles in {elapsed:.4f}s")
+
+
+def load_puzzles(filename):
+    """
+    Load puzzles from a JSON file.
+
+    The file holds an object whose "puzzles" key is a list of puzzles.
+    Each puzzle has a "name", a list of "characters", a list of
+    "statements" (each with a "speaker" and the sentence it "says"),
+    and optionally a list of "facts" known to be true.
+
+    Sentences are nested lists such as ["And", ["Knight", "A"], ["Knave", "B"]],
+    using the connectives from logic.py, plus ["Knight", name],
+    ["Knave", name] and ["Says", name, sentence].
+    """
+    with open(filename) as f:
+        return json.load(f)["puzzles"]
+
+
+def knight(character):
+    return Symbol(f"{character} is a Knight")
+
+
+def knave(character):
+    return Symbol(f"{character} is a Knave")
+
+
+def says(character, sentence):
+    """
+    Return a sentence meaning `character` said `sentence`:
+    true if a knight, false if a knave.
+    """
+    return And(
+        Implication(knight(character), sentence),
+        Implication(knave(character), Not(sentence)),
+    )
+
+
+def parse_sentence(expression):
+    """
+    Return the logical sentence for a nested-list expression.
+    """
+    if not isinstance(expression, list) or not expression:
+        raise ValueError(f"invalid sentence: {expression!r}")
+    operator, *arguments = expression
+    if operator == "Knight":
+        return knight(*arguments)
+    if operator == "Knave":
+        return knave(*arguments)
+    if operator == "Says":
+        character, sentence = arguments
+        return says(character, parse_sentence(sentence))
+    connectives = {
+        "Not": Not,
+        "And": And,
+        "Or": Or,
+        "Implication": Implication,
+        "Biconditional": Biconditional,
+    }
+    if operator not in connectives:
+        raise ValueError(f"unknown operator: {operator!r}")
+    return connectives[operator](
+        *[parse_sentence(argument) for argument in arguments]
+    )
+
+
+def build_knowledge(puzzle):
+    """
+    Return the list of symbols and the knowledge base for a puzzle.
+    """
+    symbols = []
+    knowledge = And()
+
+    # Every character is either a knight or a knave, but not both
+    for character in puzzle["characters"]:
+        symbols.extend([knight(character), knave(character)])
+        knowledge.add(Or(knight(character), knave(character)))
+        knowledge.add(Not(And(knight(character), knave(character))))
+
+    for statement in puzzle["statements"]:
+        knowledge.add(says(
+            statement["speaker"], parse_sentence(statement["says"])
+        ))
+    for fact in puzzle.get("facts", []):
+        knowledge.add(parse_sentence(fact))
+
+    return symbols, knowledge
+
+
+def solve(puzzle, engine):
+    """
+    Solve one puzzle, returning its conclusions along with the time
+    taken, the number of models explored and the number of models
+    consistent with the puzzle.
+    """
+    start = time.perf_counter()
+    symbols, knowledge = build_knowledge(puzzle)
+
+    if engine == "models":
+        knowledgeBase = KnowledgeBase(*knowledge.conjuncts)
+        conclusions = [str(symbol) for symbol in symbols
+                       if knowledgeBase.entails(symbol)]
+        explored = knowledgeBase.explored
+        models = len(knowledgeBase.models)
+    else:
+        # A symbol is entailed when it is true in every model
+        counter = ModelCounter(knowledge)
+        models, trues = counter.solve(())
+        conclusions = [
+            str(symbol) for symbol in symbols
+            if trues[counter.cnf.variables[symbol.name]] == models
+        ]
+        explored = counter.decisions
+
+    return {
+        "name": puzzle["name"],
+        "conclusions": conclusions,
+        "time": time.perf_counter() - start,
+        "explored": explored,
+        "models": models,
+    }
+
+
+if __name__ == "__main__":
+    main()
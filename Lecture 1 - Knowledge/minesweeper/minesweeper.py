@@ -1,5 +1,9 @@
 import itertools
+import math
 import random
+import time
+
+import numpy as np
 
 
 class Minesweeper:
@@ -13,21 +17,26 @@ class Minesweeper:
         self.width = width
         self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Initialize an empty field with no mines,
+        # one byte per cell with cell (i, j) at i * width + j
+        self.board = bytearray(self.height * self.width)
 
         # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        for index in random.sample(range(height * width), mines):
+            self.mines.add(divmod(index, width))
+            self.board[index] = True
+
+        # Count the mines around every cell at once: convolve the board
+        # with a 3x3 kernel of ones but for the center, as a sum of the
+        # board shifted one step in each of the eight directions
+        grid = np.frombuffer(bytes(self.board), dtype=np.uint8)
+        padded = np.pad(grid.reshape(height, width), 1)
+        counts = np.zeros((height, width), dtype=np.uint8)
+        for di in range(3):
+            for dj in range(3):
+                if (di, dj) != (1, 1):
+                    counts += padded[di:di + height, dj:dj + width]
+        self.counts = counts.tobytes()
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -40,7 +49,7 @@ class Minesweeper:
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.board[i * self.width + j]:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -49,7 +58,7 @@ class Minesweeper:
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i * self.width + j])
 
     def nearby_mines(self, cell):
         """
@@ -57,23 +66,8 @@ class Minesweeper:
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self.counts[i * self.width + j]
 
     def won(self):
         """
@@ -87,23 +81,119 @@ class Sentence:
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+
+    Cells are stored as the bits of an integer, with cell (i, j) at
+    bit i * width + j. The bits are shifted down by `offset` so that
+    a sentence about a few neighboring cells stays a small integer
+    wherever it is on the board.
     """
 
-    def __init__(self, cells, count):
-        self.cells = set(cells)
+    __slots__ = ("width", "offset", "bits", "count")
+
+    def __init__(self, cells, count, width=None):
+        cells = set(cells)
+        if width is None:
+            width = max((j for i, j in cells), default=0) + 1
+        self.width = width
+        self.offset = 0
+        self.bits = 0
+        for i, j in cells:
+            self.bits |= 1 << (i * width + j)
         self.count = count
+        self.normalize()
+
+    @classmethod
+    def from_bits(cls, offset, bits, count, width):
+        """
+        Returns a sentence about the cells set in `bits`, shifted up by
+        `offset`, on a board of the given width.
+        """
+        sentence = cls.__new__(cls)
+        sentence.width = width
+        sentence.offset = offset
+        sentence.bits = bits
+        sentence.count = count
+        sentence.normalize()
+        return sentence
+
+    def normalize(self):
+        """
+        Shifts the bits down so that the lowest cell is bit 0.
+        """
+        if self.bits:
+            low = (self.bits & -self.bits).bit_length() - 1
+            self.bits >>= low
+            self.offset += low
+        else:
+            self.offset = 0
+
+    @property
+    def cells(self):
+        return {divmod(index, self.width) for index in self.indices()}
+
+    def indices(self):
+        """
+        Returns the board indices of the cells in the sentence.
+        """
+        indices = []
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            indices.append(self.offset + low.bit_length() - 1)
+            bits ^= low
+        return indices
+
+    def key(self):
+        """
+        Returns a hashable value identifying the sentence.
+        """
+        return (self.offset, self.bits, self.count)
+
+    def __len__(self):
+        return self.bits.bit_count()
 
     def __eq__(self, other):
+        if self.width == other.width:
+            return self.key() == other.key()
         return self.cells == other.cells and self.count == other.count
 
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
+    def issubset(self, other):
+        """
+        Checks if every cell in the sentence is also in `other`.
+        """
+        if not self.bits:
+            return True
+        if self.width != other.width:
+            return self.cells <= other.cells
+        shift = self.offset - other.offset
+        return shift >= 0 and not (self.bits << shift) & ~other.bits
+
+    def __sub__(self, other):
+        """
+        Returns the sentence about cells not in `other`, whose count
+        is correct when `other` is a subset of this sentence.
+        """
+        if self.width != other.width:
+            return Sentence(
+                self.cells - other.cells, self.count - other.count, self.width
+            )
+        shift = other.offset - self.offset
+        if shift >= 0:
+            bits = self.bits & ~(other.bits << shift)
+        else:
+            bits = self.bits & ~(other.bits >> -shift)
+        return Sentence.from_bits(
+            self.offset, bits, self.count - other.count, self.width
+        )
+
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
         """
-        if self.count >= 1 and len(self.cells) == self.count:
+        if self.count >= 1 and len(self) == self.count:
             return self.cells
         return set()
 
@@ -115,13 +205,26 @@ class Sentence:
             return self.cells
         return set()
 
+    def remove(self, cell):
+        """
+        Removes a cell from the sentence, returning whether it was there.
+        """
+        i, j = cell
+        if not 0 <= j < self.width:
+            return False
+        shift = i * self.width + j - self.offset
+        if shift < 0 or not self.bits >> shift & 1:
+            return False
+        self.bits ^= 1 << shift
+        self.normalize()
+        return True
+
     def mark_mine(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be a mine.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        if self.remove(cell):
             self.count -= 1
 
     def mark_safe(self, cell):
@@ -129,8 +232,233 @@ class Sentence:
         Updates internal knowledge representation given the fact that
         a cell is known to be safe.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        self.remove(cell)
+
+
+class CellSet:
+    """
+    Set of cells on a board, stored as one byte per cell.
+    """
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.flags = bytearray(height * width)
+        self.size = 0
+
+    def __contains__(self, cell):
+        i, j = cell
+        return (0 <= i < self.height and 0 <= j < self.width
+                and self.flags[i * self.width + j] == 1)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        index = self.flags.find(1)
+        while index != -1:
+            yield divmod(index, self.width)
+            index = self.flags.find(1, index + 1)
+
+    def add(self, cell):
+        i, j = cell
+        if not self.flags[i * self.width + j]:
+            self.flags[i * self.width + j] = 1
+            self.size += 1
+
+    def copy(self):
+        """
+        Returns the cells as a set of (i, j) tuples.
+        """
+        return set(self)
+
+
+class MineCounter:
+    """
+    Counts the ways mines can be placed in cells so that a set of
+    sentences hold, split by how many mines are used.
+
+    Sentences are given as (cells, count) pairs of a frozenset and an int.
+    Sentences that share no cells are counted independently, and the
+    result for each group of sentences is remembered between calls,
+    including calls that ran out of time before finishing.
+    """
+
+    def __init__(self, limit=100000):
+        self.cache = dict()
+        self.limit = limit
+        self.deadline = None
+
+    def count(self, constraints, deadline=None):
+        """
+        Returns `ways`, a list where ways[k] is the number of placements
+        using k mines, and `cells`, a dictionary mapping each cell to the
+        same list counting only placements where that cell is a mine.
+
+        Raises TimeoutError if counting is still going at `deadline`,
+        a time.perf_counter() value.
+        """
+        self.deadline = deadline
+        try:
+            return self.tally(constraints)
+        finally:
+            self.deadline = None
+
+    def tally(self, constraints):
+        """
+        Counts placements as `count` does, without setting a deadline.
+        """
+        constraints = frozenset(constraints)
+        if constraints in self.cache:
+            return self.cache[constraints]
+
+        # Fill in cells whose value follows directly from one sentence
+        forced = dict()
+        remaining = set(constraints)
+        while True:
+            decided = next((
+                (cells, count) for cells, count in remaining
+                if count == 0 or count == len(cells)
+            ), None)
+            if decided is None:
+                break
+            for cell in decided[0]:
+                forced[cell] = 1 if decided[1] else 0
+            remaining = self.assign(remaining, forced)
+            if remaining is None:
+                return [0], dict()
+
+        # Each forced cell is a group of its own with only one placement
+        ways, cells = [1], dict()
+        for cell, value in forced.items():
+            group = ([0, 1], {cell: [0, 1]}) if value else ([1], {cell: [0]})
+            ways, cells = self.combine(ways, cells, *group)
+
+        for group in self.groups(remaining):
+            ways, cells = self.combine(ways, cells, *self.split(group))
+
+        if len(self.cache) >= self.limit:
+            self.cache.clear()
+        self.cache[constraints] = ways, cells
+        return ways, cells
+
+    def split(self, constraints):
+        """
+        Counts a connected group of sentences by trying both values
+        for the cell that appears in the most sentences.
+        """
+        appearances = dict()
+        for cells, count in constraints:
+            for cell in cells:
+                appearances[cell] = appearances.get(cell, 0) + 1
+        cell = max(sorted(appearances), key=appearances.get)
+
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise TimeoutError("ran out of time counting mine placements")
+
+        ways, cells = [0], dict()
+        for value in (0, 1):
+            remaining = self.assign(constraints, {cell: value})
+            if remaining is None:
+                continue
+            branchWays, branchCells = self.tally(remaining)
+            branchCells = dict(branchCells)
+            branchCells[cell] = branchWays if value else [0]
+            if value:
+                branchWays = [0] + branchWays
+                branchCells = {
+                    other: [0] + counts for other, counts in branchCells.items()
+                }
+            ways = self.add(ways, branchWays)
+            for other, counts in branchCells.items():
+                cells[other] = self.add(cells.get(other, [0]), counts)
+        return ways, cells
+
+    @staticmethod
+    def assign(constraints, values):
+        """
+        Returns the sentences left after giving cells the values
+        in `values` (1 for a mine), or None if any sentence is broken.
+        """
+        remaining = set()
+        for cells, count in constraints:
+            known = cells.intersection(values)
+            if known:
+                cells = cells - known
+                count -= sum(values[cell] for cell in known)
+                if count < 0 or count > len(cells):
+                    return None
+                if not cells:
+                    continue
+            remaining.add((cells, count))
+        return remaining
+
+    @staticmethod
+    def groups(constraints):
+        """
+        Splits sentences into groups that share no cells.
+        """
+        byCell = dict()
+        for constraint in constraints:
+            for cell in constraint[0]:
+                byCell.setdefault(cell, []).append(constraint)
+
+        seen = set()
+        groups = []
+        for start in constraints:
+            if start in seen:
+                continue
+            seen.add(start)
+            group = []
+            frontier = [start]
+            while frontier:
+                constraint = frontier.pop()
+                group.append(constraint)
+                for cell in constraint[0]:
+                    for other in byCell[cell]:
+                        if other not in seen:
+                            seen.add(other)
+                            frontier.append(other)
+            groups.append(group)
+        return groups
+
+    @classmethod
+    def combine(cls, ways, cells, groupWays, groupCells):
+        """
+        Combines the counts of two independent groups of cells.
+        """
+        combined = {
+            cell: cls.multiply(counts, groupWays)
+            for cell, counts in cells.items()
+        }
+        for cell, counts in groupCells.items():
+            combined[cell] = cls.multiply(counts, ways)
+        return cls.multiply(ways, groupWays), combined
+
+    @staticmethod
+    def add(a, b):
+        """
+        Adds two lists of counts indexed by number of mines.
+        """
+        if len(a) < len(b):
+            a, b = b, a
+        result = list(a)
+        for k, value in enumerate(b):
+            result[k] += value
+        return result
+
+    @staticmethod
+    def multiply(a, b):
+        """
+        Returns the counts for placing mines in both of two independent
+        groups, given the counts for each indexed by number of mines.
+        """
+        result = [0] * (len(a) + len(b) - 1)
+        for i, x in enumerate(a):
+            if x:
+                for j, y in enumerate(b):
+                    result[i + j] += x * y
+        return result
 
 
 class MinesweeperAI:
@@ -138,20 +466,47 @@ class MinesweeperAI:
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None, budget=None):
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Total number of mines on the board, if known
+        self.mine_count = mines
+
+        # Seconds each move may spend counting mine placements to find
+        # more safes and mines, or None to only compare sentences
+        self.budget = budget
+
         # Keep track of which cells have been clicked on
-        self.moves_made = set()
+        self.moves_made = CellSet(height, width)
 
         # Keep track of cells known to be safe or mines
-        self.mines = set()
-        self.safes = set()
+        self.mines = CellSet(height, width)
+        self.safes = CellSet(height, width)
+
+        # Sentences about the game known to be true, by key
+        self.sentences = dict()
+
+        # Sentences containing each cell index, so that marking a cell
+        # and inference only revisit the sentences that cell is in
+        self.index = dict()
+
+        # Sentences added or changed since inference last looked at them
+        self.pending = []
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Number of sentences dropped for being empty or duplicates
+        self.dropped = 0
+
+        # Counts of mine placements, kept between moves
+        self.counter = MineCounter()
+
+    @property
+    def knowledge(self):
+        """
+        List of sentences about the game known to be true.
+        """
+        return list(self.sentences.values())
 
     def mark_mine(self, cell):
         """
@@ -159,8 +514,11 @@ class MinesweeperAI:
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        i, j = cell
+        for sentence in self.index.pop(i * self.width + j, []):
+            del self.sentences[sentence.key()]
             sentence.mark_mine(cell)
+            self.refile(sentence)
 
     def mark_safe(self, cell):
         """
@@ -168,8 +526,91 @@ class MinesweeperAI:
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        i, j = cell
+        for sentence in self.index.pop(i * self.width + j, []):
+            del self.sentences[sentence.key()]
             sentence.mark_safe(cell)
+            self.refile(sentence)
+
+    def refile(self, sentence):
+        """
+        Files a sentence that lost a cell under its new key and queues it
+        to be looked at again, or drops it if it is now empty or the same
+        as another sentence.
+        """
+        key = sentence.key()
+        if sentence.bits and key not in self.sentences:
+            self.sentences[key] = sentence
+            self.pending.append(sentence)
+            return
+
+        self.dropped += 1
+        for index in sentence.indices():
+            self.index[index] = [
+                other for other in self.index[index] if other is not sentence
+            ]
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base unless it is empty or an
+        equal one is already known, and queues it for inference.
+        """
+        key = sentence.key()
+        if not sentence.bits or key in self.sentences:
+            return
+        self.sentences[key] = sentence
+        for index in sentence.indices():
+            self.index.setdefault(index, []).append(sentence)
+        self.pending.append(sentence)
+
+    def knowledge_size(self):
+        """
+        Returns a dictionary describing the size of the knowledge base:
+        the number of sentences, the cells they mention in total, the
+        distinct cells they mention, and the sentences dropped so far.
+        """
+        return {
+            "sentences": len(self.sentences),
+            "cells": sum(len(sentence) for sentence in self.knowledge),
+            "indexed": len(self.index),
+            "dropped": self.dropped,
+        }
+
+    def infer(self):
+        """
+        Draws conclusions from pending sentences until nothing changes.
+
+        A sentence only needs comparing with sentences it shares
+        a cell with, since one set of cells can only be a subset
+        of another if they overlap.
+        """
+        while self.pending:
+            sentence = self.pending.pop()
+            if self.sentences.get(sentence.key()) is not sentence:
+                # Dropped since it was queued
+                continue
+
+            # 4) mark any additional cells as safe or as mines
+            # if it can be concluded based on the AI's knowledge base
+            for cell in sentence.known_mines():
+                if cell not in self.mines:
+                    self.mark_mine(cell)
+            for cell in sentence.known_safes():
+                if cell not in self.safes:
+                    self.mark_safe(cell)
+
+            # 5) add any new sentences to the AI's knowledge base
+            # if they can be inferred from existing knowledge
+            others = dict()
+            for index in sentence.indices():
+                for other in self.index.get(index, []):
+                    if other is not sentence:
+                        others[id(other)] = other
+            for other in others.values():
+                if sentence.issubset(other):
+                    self.add_sentence(other - sentence)
+                elif other.issubset(sentence):
+                    self.add_sentence(sentence - other)
 
     def add_knowledge(self, cell, count):
         """
@@ -208,38 +649,51 @@ class MinesweeperAI:
                 if 0 <= i < self.height and 0 <= j < self.width:
                     newSentence.add((i, j))
 
-        self.knowledge.append(Sentence(newSentence, count))
+        self.add_sentence(Sentence(newSentence, count, self.width))
+        self.infer()
 
-        changeKnowledge = True
-        while changeKnowledge:
-            changeKnowledge = False
-            # 4) mark any additional cells as safe or as mines
-            # if it can be concluded based on the AI's knowledge base
-            for sentence in self.knowledge:
-                # new mine
-                for cell in sentence.known_mines().copy():
-                    if cell not in self.mines:
-                        self.mark_mine(cell)
-                        changeKnowledge = True
-                # new safe
-                for cell in sentence.known_safes().copy():
-                    if cell not in self.safes:
-                        self.mark_safe(cell)
-                        changeKnowledge = True
-            # 5) add any new sentences to the AI's knowledge base
-            # if they can be inferred from existing knowledge
-            for sentence1 in self.knowledge:
-                for sentence2 in self.knowledge:
-                    if sentence1 == sentence2:
-                        continue
-                    if sentence1.cells.issubset(sentence2.cells):
-                        newSentence = Sentence(
-                            sentence2.cells - sentence1.cells,
-                            sentence2.count - sentence1.count,
-                        )
-                        if newSentence not in self.knowledge:
-                            self.knowledge.append(newSentence)
-                            changeKnowledge = True
+        if self.budget is not None:
+            self.solve()
+
+    def solve(self):
+        """
+        Marks every cell that is a mine in all placements of mines
+        consistent with the knowledge base and the total number of mines,
+        or in none of them, until nothing changes or the move has taken
+        longer than self.budget seconds.
+        """
+        deadline = time.perf_counter() + self.budget
+        while time.perf_counter() < deadline:
+            try:
+                total, counts, other = self.placements(deadline)
+            except TimeoutError:
+                return
+            if total == 0:
+                return
+
+            mines = [cell for cell, n in counts.items() if n == total]
+            safes = [cell for cell, n in counts.items() if n == 0]
+
+            # Cells no sentence mentions are all alike, so the total
+            # number of mines can decide them all at once
+            if other == 0 or other == total:
+                others = [
+                    (i, j)
+                    for i in range(self.height)
+                    for j in range(self.width)
+                    if (i, j) not in counts
+                    and (i, j) not in self.safes
+                    and (i, j) not in self.mines
+                ]
+                (mines if other else safes).extend(others)
+
+            if not mines and not safes:
+                return
+            for cell in mines:
+                self.mark_mine(cell)
+            for cell in safes:
+                self.mark_safe(cell)
+            self.infer()
 
     def make_safe_move(self):
         """
@@ -267,3 +721,104 @@ class MinesweeperAI:
                 if (i, j) not in self.mines and (i, j) not in self.moves_made:
                     return (i, j)
         return None
+
+    def mine_probabilities(self):
+        """
+        Returns a dictionary mapping each cell that has not been chosen
+        and is not known to be a mine to the probability that it is a mine.
+
+        Every placement of mines consistent with the knowledge base is
+        equally likely. If the total number of mines is known, placements
+        are weighted by the ways to place the remaining mines in cells
+        no sentence mentions.
+        """
+        unknown = [
+            (i, j)
+            for i in range(self.height)
+            for j in range(self.width)
+            if (i, j) not in self.moves_made and (i, j) not in self.mines
+        ]
+        total, counts, other = self.placements()
+        others = [
+            cell for cell in unknown
+            if cell not in counts and cell not in self.safes
+        ]
+
+        probabilities = {cell: 0 for cell in unknown}
+        for cell, n in counts.items():
+            probabilities[cell] = n / total
+
+        # Without a mine count, assume the density seen in the sentences
+        if other is None:
+            if counts:
+                density = sum(n for n in counts.values()) / total / len(counts)
+            else:
+                density = 0.5
+            for cell in others:
+                probabilities[cell] = density
+        else:
+            for cell in others:
+                probabilities[cell] = other / total
+        return probabilities
+
+    def placements(self, deadline=None):
+        """
+        Counts placements of mines consistent with the knowledge base,
+        weighted by the ways to place the remaining mines in cells no
+        sentence mentions if the total number of mines is known.
+
+        Returns `total`, the number of placements, `counts`, a dictionary
+        mapping each cell a sentence mentions to the number of placements
+        where it is a mine, and `other`, the number of placements where
+        any one cell no sentence mentions is a mine, or None if the total
+        number of mines is not known or disagrees with the knowledge base.
+        """
+        constraints = {
+            (frozenset(sentence.cells), sentence.count)
+            for sentence in self.sentences.values()
+        }
+        ways, cells = self.counter.count(constraints, deadline)
+
+        # Cells left that are not known to be safe and in no sentence
+        free = (self.height * self.width - len(self.safes)
+                - len(self.mines) - len(cells))
+
+        if self.mine_count is None:
+            weights = [1] * len(ways)
+            otherWeights = None
+        else:
+            left = self.mine_count - len(self.mines)
+            weights = [
+                math.comb(free, left - k) if left >= k else 0
+                for k in range(len(ways))
+            ]
+            otherWeights = [
+                math.comb(free - 1, left - k - 1)
+                if free and left > k else 0
+                for k in range(len(ways))
+            ]
+
+        total = sum(w * x for w, x in zip(weights, ways))
+        if total == 0:
+            # The mine count disagrees with the knowledge base
+            weights, otherWeights = [1] * len(ways), None
+            total = sum(ways)
+
+        counts = {
+            cell: sum(w * x for w, x in zip(weights, cellWays))
+            for cell, cellWays in cells.items()
+        }
+        if otherWeights is None:
+            return total, counts, None
+        return total, counts, sum(w * x for w, x in zip(otherWeights, ways))
+
+    def make_best_move(self):
+        """
+        Returns the cell least likely to be a mine among cells that
+        have not already been chosen and are not known to be mines,
+        or None if there are no such cells.
+        """
+        probabilities = self.mine_probabilities()
+        if not probabilities:
+            return None
+        return min(probabilities, key=probabilities.get)
@@ -8,6 +8,12 @@ HEIGHT = 8
 WIDTH = 8
 MINES = 8
 
+# Seconds the AI may spend per move reasoning with the number of mines
+BUDGET = 0.1
+
+# Frames drawn per second at most
+FPS = 30
+
 # Colors
 BLACK = (0, 0, 0)
 GRAY = (180, 180, 180)
@@ -37,19 +43,83 @@ flag = pygame.transform.scale(flag, (cell_size, cell_size))
 mine = pygame.image.load("assets/images/mine.png")
 mine = pygame.transform.scale(mine, (cell_size, cell_size))
 
+# Render the number of nearby mines once for each possible count
+numbers = [smallFont.render(str(n), True, BLACK) for n in range(9)]
+
+# Board is drawn onto its own surface, and each cell is redrawn
+# only when it changes
+board = pygame.Surface((WIDTH * cell_size, HEIGHT * cell_size))
+
+
+def draw_cell(cell):
+    """
+    Draw a cell onto the board surface as it currently looks.
+    """
+    i, j = cell
+    rect = pygame.Rect(j * cell_size, i * cell_size, cell_size, cell_size)
+    pygame.draw.rect(board, GRAY, rect)
+    pygame.draw.rect(board, WHITE, rect, 3)
+
+    # Add a mine, flag, or number if needed
+    if game.is_mine(cell) and lost:
+        board.blit(mine, rect)
+    elif cell in flags:
+        board.blit(flag, rect)
+    elif cell in revealed:
+        neighbors = numbers[game.nearby_mines(cell)]
+        neighborsTextRect = neighbors.get_rect()
+        neighborsTextRect.center = rect.center
+        board.blit(neighbors, neighborsTextRect)
+
+
+def cell_at(position):
+    """
+    Return the board cell at a screen position, or None if the
+    position is not on the board.
+    """
+    x, y = position
+    i = int((y - board_origin[1]) // cell_size)
+    j = int((x - board_origin[0]) // cell_size)
+    if 0 <= i < HEIGHT and 0 <= j < WIDTH:
+        return (i, j)
+    return None
+
+
+# AI Move and Reset buttons
+aiButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+aiButtonText = mediumFont.render("AI Move", True, BLACK)
+resetButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+resetButtonText = mediumFont.render("Reset", True, BLACK)
+results = {
+    text: mediumFont.render(text, True, WHITE)
+    for text in ["Lost", "Won", ""]
+}
+
 # Create game and AI agent
 game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES, budget=BUDGET)
 
 # Keep track of revealed cells, flagged cells, and if a mine was hit
 revealed = set()
 flags = set()
 lost = False
 
+# Cells to redraw before the next frame
+dirty = {(i, j) for i in range(HEIGHT) for j in range(WIDTH)}
+
 # Show instructions initially
 instructions = True
 
+clock = pygame.time.Clock()
+
 while True:
+    clock.tick(FPS)
 
     # Check if game quit
     for event in pygame.event.get():
@@ -99,62 +169,26 @@ while True:
         continue
 
     # Draw board
-    cells = []
-    for i in range(HEIGHT):
-        row = []
-        for j in range(WIDTH):
-
-            # Draw rectangle for cell
-            rect = pygame.Rect(
-                board_origin[0] + j * cell_size,
-                board_origin[1] + i * cell_size,
-                cell_size, cell_size
-            )
-            pygame.draw.rect(screen, GRAY, rect)
-            pygame.draw.rect(screen, WHITE, rect, 3)
-
-            # Add a mine, flag, or number if needed
-            if game.is_mine((i, j)) and lost:
-                screen.blit(mine, rect)
-            elif (i, j) in flags:
-                screen.blit(flag, rect)
-            elif (i, j) in revealed:
-                neighbors = smallFont.render(
-                    str(game.nearby_mines((i, j))),
-                    True, BLACK
-                )
-                neighborsTextRect = neighbors.get_rect()
-                neighborsTextRect.center = rect.center
-                screen.blit(neighbors, neighborsTextRect)
-
-            row.append(rect)
-        cells.append(row)
+    for cell in dirty:
+        draw_cell(cell)
+    dirty.clear()
+    screen.blit(board, board_origin)
 
     # AI Move button
-    aiButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("AI Move", True, BLACK)
-    buttonRect = buttonText.get_rect()
+    buttonRect = aiButtonText.get_rect()
     buttonRect.center = aiButton.center
     pygame.draw.rect(screen, WHITE, aiButton)
-    screen.blit(buttonText, buttonRect)
+    screen.blit(aiButtonText, buttonRect)
 
     # Reset button
-    resetButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("Reset", True, BLACK)
-    buttonRect = buttonText.get_rect()
+    buttonRect = resetButtonText.get_rect()
     buttonRect.center = resetButton.center
     pygame.draw.rect(screen, WHITE, resetButton)
-    screen.blit(buttonText, buttonRect)
+    screen.blit(resetButtonText, buttonRect)
 
     # Display text
     text = "Lost" if lost else "Won" if game.mines == flags else ""
-    text = mediumFont.render(text, True, WHITE)
+    text = results[text]
     textRect = text.get_rect()
     textRect.center = ((5 / 6) * width, (2 / 3) * height)
     screen.blit(text, textRect)
@@ -165,15 +199,14 @@ while True:
 
     # Check for a right-click to toggle flagging
     if right == 1 and not lost:
-        mouse = pygame.mouse.get_pos()
-        for i in range(HEIGHT):
-            for j in range(WIDTH):
-                if cells[i][j].collidepoint(mouse) and (i, j) not in revealed:
-                    if (i, j) in flags:
-                        flags.remove((i, j))
-                    else:
-                        flags.add((i, j))
-                    time.sleep(0.2)
+        cell = cell_at(pygame.mouse.get_pos())
+        if cell is not None and cell not in revealed:
+            if cell in flags:
+                flags.remove(cell)
+            else:
+                flags.add(cell)
+            dirty.add(cell)
+            time.sleep(0.2)
 
     elif left == 1:
         mouse = pygame.mouse.get_pos()
@@ -182,12 +215,14 @@ while True:
         if aiButton.collidepoint(mouse) and not lost:
             move = ai.make_safe_move()
             if move is None:
-                move = ai.make_random_move()
+                move = ai.make_best_move()
                 if move is None:
+                    dirty.update(flags)
                     flags = ai.mines.copy()
+                    dirty.update(flags)
                     print("No moves left to make.")
                 else:
-                    print("No known safe moves, AI making random move.")
+                    print("No known safe moves, AI making best guess.")
             else:
                 print("AI making safe move.")
             time.sleep(0.2)
@@ -195,28 +230,31 @@ while True:
         # Reset game state
         elif resetButton.collidepoint(mouse):
             game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-            ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+            ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES,
+                               budget=BUDGET)
             revealed = set()
             flags = set()
             lost = False
+            dirty = {(i, j) for i in range(HEIGHT) for j in range(WIDTH)}
             continue
 
         # User-made move
         elif not lost:
-            for i in range(HEIGHT):
-                for j in range(WIDTH):
-                    if (cells[i][j].collidepoint(mouse)
-                            and (i, j) not in flags
-                            and (i, j) not in revealed):
-                        move = (i, j)
+            cell = cell_at(mouse)
+            if (cell is not None
+                    and cell not in flags
+                    and cell not in revealed):
+                move = cell
 
     # Make move and update AI knowledge
     if move:
         if game.is_mine(move):
             lost = True
+            dirty.update(game.mines)
         else:
             nearby = game.nearby_mines(move)
             revealed.add(move)
+            dirty.add(move)
             ai.add_knowledge(move, nearby)
 
     pygame.display.flip()
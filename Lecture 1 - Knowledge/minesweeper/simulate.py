@@ -0,0 +1,129 @@
+import argparse
+import os
+import random
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play Minesweeper games with the AI, without a display."
+    )
+    parser.add_argument("--games", type=int, default=100,
+                        help="number of games to play")
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--mines", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first game; game n uses seed + n")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="seconds per move for the AI to count mine "
+                             "placements, using the total number of mines")
+    parser.add_argument("--interval", type=int, default=10,
+                        help="moves between knowledge base size samples")
+    args = parser.parse_args()
+    if args.mines >= args.height * args.width:
+        parser.error("there must be fewer mines than cells")
+
+    seeds = range(args.seed, args.seed + args.games)
+    n = len(seeds)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(
+            play,
+            [args.height] * n, [args.width] * n, [args.mines] * n,
+            seeds, [args.budget] * n, [args.interval] * n,
+            chunksize=max(1, n // (4 * (args.workers or 1)))
+        ))
+    elapsed = time.perf_counter() - start
+
+    report(results, args.interval, elapsed)
+
+
+def play(height, width, mines, seed, budget=None, interval=10):
+    """
+    Play one seeded game with the AI, giving it `budget` seconds
+    per move to count mine placements. Returns whether it was won,
+    the number of moves made, the time taken by the whole game and
+    by `add_knowledge`, and the size of the knowledge base every
+    `interval` moves.
+    """
+    random.seed(seed)
+    start = time.perf_counter()
+    game = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, mines=mines,
+                       budget=budget)
+
+    won = False
+    moves = 0
+    knowledgeTime = 0
+    sizes = []
+    while True:
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_best_move()
+        if move is None or game.is_mine(move):
+            break
+        count = game.nearby_mines(move)
+        before = time.perf_counter()
+        ai.add_knowledge(move, count)
+        knowledgeTime += time.perf_counter() - before
+        moves += 1
+        if moves % interval == 0:
+            sizes.append(ai.knowledge_size()["sentences"])
+
+        # Every cell that is not a mine has been revealed
+        if len(ai.moves_made) == height * width - mines:
+            won = True
+            break
+
+    return {
+        "seed": seed,
+        "won": won,
+        "moves": moves,
+        "time": time.perf_counter() - start,
+        "knowledge_time": knowledgeTime,
+        "sizes": sizes,
+        "dropped": ai.knowledge_size()["dropped"],
+    }
+
+
+def report(results, interval, elapsed):
+    """
+    Print totals over all games, and the mean knowledge base size
+    after each number of moves among games that got that far.
+    """
+    games = len(results)
+    wins = sum(result["won"] for result in results)
+    moves = sum(result["moves"] for result in results)
+    gameTime = sum(result["time"] for result in results)
+    knowledgeTime = sum(result["knowledge_time"] for result in results)
+
+    print(f"Played {games} games in {elapsed:.3f}s")
+    print(f"Win rate: {wins}/{games} ({100 * wins / max(games, 1):.1f}%)")
+    print(f"Moves: {moves} ({moves / max(gameTime, 1e-9):.1f} moves/s "
+          f"per process)")
+    print(f"Time in add_knowledge: {knowledgeTime:.3f}s "
+          f"({1e6 * knowledgeTime / max(moves, 1):.1f} us/move, "
+          f"{100 * knowledgeTime / max(gameTime, 1e-9):.1f}% of game time)")
+
+    dropped = sum(result["dropped"] for result in results)
+    print(f"Sentences dropped as empty or duplicates: {dropped}")
+
+    print("Knowledge base size:")
+    print(f"{'moves':>8} {'games':>6} {'mean':>10} {'max':>8}")
+    longest = max((len(result["sizes"]) for result in results), default=0)
+    for k in range(longest):
+        sizes = [result["sizes"][k] for result in results
+                 if len(result["sizes"]) > k]
+        print(f"{(k + 1) * interval:>8} {len(sizes):>6} "
+              f"{sum(sizes) / len(sizes):>10.1f} {max(sizes):>8}")
+
+
+if __name__ == "__main__":
+    main()
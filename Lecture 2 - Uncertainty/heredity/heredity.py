@@ -2,6 +2,8 @@ import csv
 import itertools
 import sys
 
+import numpy as np
+
 PROBS = {
     # Unconditional probabilities for having gene
     "gene": {2: 0.01, 1: 0.03, 0: 0.96},
@@ -18,50 +20,363 @@ PROBS = {
 }
 
 
+GENES = (0, 1, 2)
+
+METHODS = ["enumerate", "eliminate", "vectorize"]
+
+# Gene assignments evaluated at once by the vectorized backend
+BATCH = 1 << 16
+
+
 def main():
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit(
+            "Usage: python heredity.py data.csv [enumerate|eliminate|vectorize]"
+        )
+    method = sys.argv[2] if len(sys.argv) == 3 else "enumerate"
+    if method not in METHODS:
+        sys.exit(f"Unknown method {method}, expected one of {METHODS}")
     people = load_data(sys.argv[1])
 
+    if method == "eliminate":
+        probabilities = eliminate(people)
+    elif method == "vectorize":
+        probabilities = vectorize(people)
+    else:
+        probabilities = enumerate_all(people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def enumerate_all(people):
+    """
+    Return the gene and trait distribution of each person, found by
+    summing the joint probability of every assignment of genes, with
+    known traits fixed and unknown traits summed over.
+    """
     # Keep track of gene and trait probabilities for each person
     probabilities = {
         person: {"gene": {2: 0, 1: 0, 0: 0}, "trait": {True: 0, False: 0}}
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
+    # Known traits are fixed, and unknown ones are summed over in update
     names = set(people)
-    for have_trait in powerset(names):
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (
-                people[person]["trait"] is not None
-                and people[person]["trait"] != (person in have_trait)
-            )
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    have_trait = {person for person in names if people[person]["trait"]}
+    unknown = {person for person in names if people[person]["trait"] is None}
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # Loop over all sets of people who might have the gene
+    for one_gene in powerset(names):
+        for two_genes in powerset(names - one_gene):
+            # Update probabilities with new joint probability
+            p = joint_probability(people, one_gene, two_genes, have_trait, unknown)
+            update(probabilities, one_gene, two_genes, have_trait, p, unknown)
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
 
-    # Print results
+
+def eliminate(people):
+    """
+    Return the gene and trait distribution of each person, found by
+    variable elimination over the family as a Bayesian network.
+
+    Each person contributes one factor over their gene count and their
+    parents' gene counts, times the probability of their trait if it is
+    known. Unknown traits sum to 1 over both values, so they drop out.
+    Eliminating the gene variables one at a time, fewest neighbours
+    first, builds a tree of cliques; passing messages up and back down
+    that tree gives every person's marginal in two sweeps, so the cost
+    grows with the number of people rather than exponentially.
+    """
+    factors = {person: person_factor(people, person) for person in people}
+
+    # Connect each person to everyone they share a factor with
+    neighbors = {person: set() for person in people}
+    for variables, _ in factors.values():
+        for person in variables:
+            neighbors[person].update(variables)
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        neighbors[person].discard(person)
+
+    # Eliminate people in order, joining each one's neighbours together
+    order = []
+    position = {}
+    separators = {}
+    remaining = dict.fromkeys(people)
+    while remaining:
+        person = min(remaining, key=lambda p: len(neighbors[p]))
+        adjacent = neighbors[person]
+        for other in adjacent:
+            neighbors[other].discard(person)
+            neighbors[other].update(adjacent - {other})
+        separators[person] = tuple(adjacent)
+        position[person] = len(order)
+        order.append(person)
+        del remaining[person]
+
+    # Each clique sends its message to the first of its neighbours to go
+    parents = {
+        person: min(separators[person], key=position.get, default=None)
+        for person in order
+    }
+    children = {person: [] for person in order}
+    for person in order:
+        if parents[person] is not None:
+            children[parents[person]].append(person)
+
+    # Each factor belongs to the clique of the first of its people to go
+    assigned = {person: [] for person in order}
+    for factor in factors.values():
+        assigned[min(factor[0], key=position.get)].append(factor)
+
+    # Collect messages towards the roots
+    potentials = {}
+    up = {}
+    for person in order:
+        potentials[person] = multiply(
+            [((person,), {(g,): 1 for g in GENES})]
+            + assigned[person]
+            + [up[child] for child in children[person]]
+        )
+        if parents[person] is not None:
+            up[person] = rescale(sum_out(potentials[person], separators[person]))
+
+    # Distribute messages back out, dividing out what each child sent
+    down = {}
+    probabilities = dict()
+    for person in reversed(order):
+        belief = potentials[person]
+        if parents[person] is not None:
+            belief = multiply([belief, down[person]])
+        for child in children[person]:
+            down[child] = rescale(sum_out(
+                multiply([belief, reciprocal(up[child])]), separators[child]
+            ))
+
+        gene = sum_out(belief, (person,))[1]
+        total = sum(gene.values())
+        gene = {g: gene[(g,)] / total for g in reversed(GENES)}
+        if people[person]["trait"] is None:
+            trait = sum(gene[g] * PROBS["trait"][g][True] for g in GENES)
+        else:
+            trait = 1 if people[person]["trait"] else 0
+        probabilities[person] = {
+            "gene": gene,
+            "trait": {True: trait, False: 1 - trait},
+        }
+
+    return {person: probabilities[person] for person in people}
+
+
+def vectorize(people):
+    """
+    Return the gene and trait distribution of each person, found by
+    evaluating the joint probability of every assignment of genes with
+    NumPy, a batch of assignments at a time.
+    """
+    names = list(people)
+    n = len(names)
+    traits = encode_traits(people, names)
+    tables = inheritance_tables()
+
+    genes = np.zeros((n, 3))
+    for assignments in gene_assignments(n):
+        p = joint_probabilities(people, names, assignments, traits, tables)
+        update_batch(genes, assignments, p)
+
+    # Unknown traits follow from the gene distribution they depend on
+    genes /= genes.sum(axis=1, keepdims=True)
+    have = genes @ tables[2][:, 1]
+    have = np.where(traits == -1, have, traits)
+
+    return {
+        person: {
+            "gene": {g: float(genes[i, g]) for g in reversed(GENES)},
+            "trait": {True: float(have[i]), False: float(1 - have[i])},
+        }
+        for i, person in enumerate(names)
+    }
+
+
+def encode_traits(people, names):
+    """
+    Return an array of the trait of each person in `names`: 1 if they
+    are known to have it, 0 if known not to, and -1 if unknown.
+    """
+    return np.array([
+        -1 if people[name]["trait"] is None else int(people[name]["trait"])
+        for name in names
+    ], dtype=np.int8)
+
+
+def inheritance_tables():
+    """
+    Return arrays of the probabilities in PROBS: the unconditional
+    probability of each gene count, the probability of each gene count
+    for a child given its mother's and father's, and the probability of
+    not having and having the trait given the gene count. The trait
+    table has a third column of ones, picked by an unknown trait of -1.
+    """
+    prior = np.array([PROBS["gene"][g] for g in GENES])
+    inheritance = np.array([
+        [[inherit(g, m, f) for f in GENES] for m in GENES] for g in GENES
+    ])
+    trait = np.array([
+        [PROBS["trait"][g][False], PROBS["trait"][g][True], 1] for g in GENES
+    ])
+    return prior, inheritance, trait
+
+
+def gene_assignments(n, batch=BATCH):
+    """
+    Yield every assignment of gene counts to `n` people, as arrays with
+    one row per assignment and one column per person, `batch` rows at
+    a time.
+    """
+    powers = 3 ** np.arange(n, dtype=np.int64)
+    for start in range(0, 3 ** n, batch):
+        index = np.arange(start, min(start + batch, 3 ** n), dtype=np.int64)
+        yield (index[:, None] // powers % 3).astype(np.int8)
+
+
+def joint_probabilities(people, names, genes, traits, tables):
+    """
+    Return the joint probability of each row of `genes`, the gene counts
+    of everyone in `names`, together with `traits`, their traits as
+    returned by `encode_traits`. `traits` may also have one row per row
+    of `genes`. Unknown traits are summed over.
+    """
+    prior, inheritance, trait = tables
+    column = {name: i for i, name in enumerate(names)}
+
+    p = np.ones(len(genes))
+    for i, name in enumerate(names):
+        mother = people[name]["mother"]
+        father = people[name]["father"]
+        if mother is None and father is None:
+            p *= prior[genes[:, i]]
+        else:
+            p *= inheritance[
+                genes[:, i], genes[:, column[mother]], genes[:, column[father]]
+            ]
+    p *= trait[genes, traits].prod(axis=1)
+    return p
+
+
+def update_batch(genes, assignments, p):
+    """
+    Add the joint probabilities `p` of `assignments` to `genes`, an array
+    of the gene distribution of each person.
+    """
+    n = genes.shape[0]
+    cells = (assignments + 3 * np.arange(n)).ravel()
+    weights = np.repeat(p, n)
+    genes += np.bincount(cells, weights=weights, minlength=3 * n).reshape(n, 3)
+
+
+def person_factor(people, person):
+    """
+    Return the factor for `person` as a pair of the people it ranges
+    over and a dictionary mapping their gene counts to a probability:
+    the probability of the person's gene count given their parents',
+    times the probability of their trait if it is known.
+    """
+    mother = people[person]["mother"]
+    father = people[person]["father"]
+    trait = people[person]["trait"]
+
+    if mother is None and father is None:
+        variables = (person,)
+        table = {(g,): PROBS["gene"][g] for g in GENES}
+    else:
+        variables = (person, mother, father)
+        table = dict()
+        for g, m, f in itertools.product(GENES, repeat=3):
+            table[(g, m, f)] = inherit(g, m, f)
+
+    if trait is not None:
+        for assignment in table:
+            table[assignment] *= PROBS["trait"][assignment[0]][trait]
+    return variables, table
+
+
+def inherit(gene, mother, father):
+    """
+    Return the probability that a child whose parents have `mother` and
+    `father` copies of the gene has `gene` copies of it.
+    """
+    passes = {0: PROBS["mutation"], 1: 0.5, 2: 1 - PROBS["mutation"]}
+    m = passes[mother]
+    f = passes[father]
+    if gene == 2:
+        return m * f
+    if gene == 1:
+        return m * (1 - f) + f * (1 - m)
+    return (1 - m) * (1 - f)
+
+
+def multiply(factors):
+    """
+    Return the product of `factors`, over all the people in any of them.
+    """
+    variables = tuple(dict.fromkeys(
+        person for scope, _ in factors for person in scope
+    ))
+    lookups = [
+        (tuple(variables.index(person) for person in scope), table)
+        for scope, table in factors
+    ]
+    table = dict()
+    for assignment in itertools.product(GENES, repeat=len(variables)):
+        p = 1
+        for indices, factor in lookups:
+            p *= factor[tuple(assignment[i] for i in indices)]
+        table[assignment] = p
+    return variables, table
+
+
+def sum_out(factor, keep):
+    """
+    Return `factor` summed over everyone not in `keep`.
+    """
+    scope, table = factor
+    indices = tuple(scope.index(person) for person in keep)
+    result = dict.fromkeys(itertools.product(GENES, repeat=len(keep)), 0)
+    for assignment, p in table.items():
+        result[tuple(assignment[i] for i in indices)] += p
+    return tuple(keep), result
+
+
+def rescale(factor):
+    """
+    Return `factor` scaled to sum to 1, so long chains of messages
+    do not underflow.
+    """
+    scope, table = factor
+    total = sum(table.values())
+    if total == 0:
+        return factor
+    return scope, {assignment: p / total for assignment, p in table.items()}
+
+
+def reciprocal(factor):
+    """
+    Return the reciprocal of `factor`, taking 0 to 0.
+    """
+    scope, table = factor
+    return scope, {
+        assignment: 1 / p if p else 0 for assignment, p in table.items()
+    }
 
 
 def load_data(filename):
@@ -93,18 +408,18 @@ def load_data(filename):
 
 def powerset(s):
     """
-    Return a list of all possible subsets of set s.
+    Return a generator of all possible subsets of set s.
     """
     s = list(s)
-    return [
-        set(s)
-        for s in itertools.chain.from_iterable(
+    return (
+        set(subset)
+        for subset in itertools.chain.from_iterable(
             itertools.combinations(s, r) for r in range(len(s) + 1)
         )
-    ]
+    )
 
 
-def joint_probability(people, one_gene, two_genes, have_trait):
+def joint_probability(people, one_gene, two_genes, have_trait, unknown=()):
     """
     Compute and return a joint probability.
 
@@ -114,6 +429,9 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone not in `one_gene` or `two_gene` does not have the gene, and
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
+
+    Everyone in set `unknown` has their trait summed over instead, so
+    it contributes a factor of 1.
     """
     entire_joint_probability = 1
     for person in people:
@@ -166,6 +484,9 @@ def joint_probability(people, one_gene, two_genes, have_trait):
                 gene = (1 - mother) * (1 - father)
 
         # trait
+        if person in unknown:
+            entire_joint_probability *= gene
+            continue
         is_trait = (
             True if people[person]["trait"] == True or person in have_trait else False
         )
@@ -176,12 +497,14 @@ def joint_probability(people, one_gene, two_genes, have_trait):
     return entire_joint_probability
 
 
-def update(probabilities, one_gene, two_genes, have_trait, p):
+def update(probabilities, one_gene, two_genes, have_trait, p, unknown=()):
     """
     Add to `probabilities` a new joint probability `p`.
     Each person should have their "gene" and "trait" distributions updated.
     Which value for each distribution is updated depends on whether
     the person is in `have_gene` and `have_trait`, respectively.
+    Everyone in `unknown` has `p` split between having the trait and not,
+    in proportion to how likely each is given their genes.
     """
     # for each person
     for person in probabilities:
@@ -191,7 +514,13 @@ def update(probabilities, one_gene, two_genes, have_trait, p):
 
         # add p to each atribution
         probabilities[person]["gene"][index_gene] += p
-        probabilities[person]["trait"][is_trait] += p
+        if person in unknown:
+            for value in (True, False):
+                probabilities[person]["trait"][value] += (
+                    p * PROBS["trait"][index_gene][value]
+                )
+        else:
+            probabilities[person]["trait"][is_trait] += p
 
 
 def normalize(probabilities):
@@ -1,50 +1,247 @@
+import collections
+import hashlib
+import itertools
+import json
 import os
 import random
 import re
 import sys
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 
 DAMPING = 0.85
 SAMPLES = 10000
+BATCH = 10000
+WALKERS = 100
+BURN_IN = 50
+CHUNK = 1 << 16
+FILES = 256
+CACHE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "pagerank"
+)
+BLOCKS = 32
+ROWS = 2048
+EDGES = 1 << 20
+EXTRAPOLATE = 10
+METHODS = ["jacobi", "gauss-seidel", "aitken", "quadratic"]
+
+# Link in an HTML page, matched against bytes as a file is read
+HREF = re.compile(rb"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# State shared by the calls in one worker process
+worker = dict()
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python pagerank.py corpus [processes]")
+    corpus = crawl(sys.argv[1], cache=cache_path(sys.argv[1]))
+    if len(sys.argv) == 3:
+        processes = int(sys.argv[2])
+        ranks, intervals = parallel_pagerank(
+            corpus, DAMPING, SAMPLES, processes=processes
+        )
+        print(f"PageRank Results from Sampling (n = {SAMPLES}, "
+              f"{processes} processes, 95% confidence)")
+        for page in sorted(ranks):
+            low, high = intervals[page]
+            print(f"  {page}: {ranks[page]:.4f} ({low:.4f} to {high:.4f})")
+    else:
+        ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+        print(f"PageRank Results from Sampling (n = {SAMPLES})")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
     ranks = iterate_pagerank(corpus, DAMPING)
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
 
-def crawl(directory):
+def crawl(directory, workers=None, edges=None, cache=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
-    """
-    pages = dict()
 
-    # Extract all links from HTML files
+    Files are read in a pool of `workers` threads. If `edges` is given,
+    the links are also saved there with `save_edges`.
+
+    If `cache` is given, the links found are saved in that file along
+    with the size and modification time of each page, and later crawls
+    only read pages that were added or changed since. `cache_path`
+    gives a cache file outside the corpus directory.
+    """
+    files = dict()
     for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+        if filename.endswith(".html"):
+            stat = os.stat(os.path.join(directory, filename))
+            files[filename] = (stat.st_size, stat.st_mtime_ns)
+
+    # Reuse the links of pages whose size and modification time match
+    known = load_cache(cache)
+    found = dict()
+    for filename in files:
+        entry = known.get(filename)
+        if entry is not None and entry[:2] == files[filename]:
+            found[filename] = entry[2]
+
+    # Extract all links from HTML files that are new or changed,
+    # a batch of files per task
+    filenames = [filename for filename in files if filename not in found]
+    if filenames:
+        paths = [os.path.join(directory, filename) for filename in filenames]
+        batches = [paths[i:i + FILES] for i in range(0, len(paths), FILES)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            scanned = itertools.chain.from_iterable(executor.map(
+                lambda batch: [scan_links(path) for path in batch], batches
+            ))
+            for filename, links in zip(filenames, scanned):
+                found[filename] = links - {filename}
+    if cache is not None and (filenames or known.keys() != files.keys()):
+        save_cache(cache, {
+            filename: files[filename] + (found[filename],)
+            for filename in files
+        })
 
     # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(link for link in pages[filename] if link in pages)
+    pages = dict()
+    for filename in files:
+        pages[filename] = set(
+            link for link in found[filename] if link in files
+        )
 
+    if edges is not None:
+        save_edges(pages, edges)
     return pages
 
 
+def cache_path(directory):
+    """
+    Return the cache file for the corpus in `directory`, kept under
+    CACHE rather than in the corpus itself and named after the
+    corpus's absolute path.
+    """
+    key = hashlib.sha256(os.path.abspath(directory).encode()).hexdigest()
+    return os.path.join(CACHE, key + ".json")
+
+
+def load_cache(path):
+    """
+    Return the links saved in a cache file by `save_cache`, as a
+    dictionary mapping each file to its size, modification time and
+    set of links, or an empty dictionary if there is no file or it
+    cannot be read.
+    """
+    if path is None:
+        return dict()
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return dict()
+    if not isinstance(cache, dict) or cache.get("version") != 2:
+        return dict()
+
+    # A cache of the wrong shape is ignored; odd sizes, times or links
+    # only fail to match the corpus
+    files = dict()
+    try:
+        for filename, (size, mtime, links) in cache["files"].items():
+            files[filename] = (size, mtime, set(links))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return dict()
+    return files
+
+
+def save_cache(path, files):
+    """
+    Save a cache of links to a JSON file, replacing any earlier one
+    only once the new one is written in full. Failing to write
+    the cache is not an error, since it only saves time.
+    """
+    cache = {
+        "version": 2,
+        "files": {
+            filename: [size, mtime, sorted(links)]
+            for filename, (size, mtime, links) in files.items()
+        },
+    }
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(cache, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+
+
+def scan_links(path):
+    """
+    Return the set of links in an HTML file, reading it in chunks of
+    CHUNK bytes rather than all at once.
+    """
+    links = set()
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK)
+            buffer = tail + chunk
+            end = 0
+            for match in HREF.finditer(buffer):
+                links.add(match.group(1))
+                end = match.end()
+            if not chunk:
+                break
+
+            # Keep the last tag, which may continue in the next chunk
+            start = buffer.rfind(b"<", end)
+            tail = buffer[start:] if start != -1 else b""
+    return {link.decode() for link in links}
+
+
+def save_edges(corpus, path):
+    """
+    Save the links of a corpus as a compact edge list.
+
+    `path` holds a pair of little-endian 32-bit page numbers for each
+    link, sorted by the page linking then the page linked to, and
+    `path` + ".pages" holds the name of each page number, one per line.
+    """
+    pages = sorted(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    with open(path + ".pages", "w") as f:
+        for page in pages:
+            print(page, file=f)
+    degrees = np.fromiter(
+        (len(corpus[page]) for page in pages), dtype=np.int64, count=len(pages)
+    )
+    edges = np.empty((int(degrees.sum()), 2), dtype="<u4")
+    edges[:, 0] = np.repeat(np.arange(len(pages)), degrees)
+    edges[:, 1] = np.fromiter(
+        (index[link] for page in pages for link in sorted(corpus[page])),
+        dtype=np.int64, count=len(edges)
+    )
+    edges.tofile(path)
+
+
+def load_edges(path):
+    """
+    Return the corpus dictionary saved in an edge list by `save_edges`.
+    """
+    with open(path + ".pages") as f:
+        pages = f.read().splitlines()
+    edges = np.fromfile(path, dtype="<u4").reshape(-1, 2)
+    corpus = {page: set() for page in pages}
+    for source, target in edges.tolist():
+        corpus[pages[source]].add(pages[target])
+    return corpus
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -59,8 +256,8 @@ def transition_model(corpus, page, damping_factor):
 
     # If page has no links, return equal probability for the corpus:
     if len(corpus[page]) == 0:
-        for page in prob:
-            prob[page] = 1 / len(corpus)
+        for other in prob:
+            prob[other] = 1 / len(corpus)
         return prob
 
     # Probability of picking any page at random:
@@ -70,11 +267,11 @@ def transition_model(corpus, page, damping_factor):
     link = damping_factor / len(corpus[page])
 
     # Add probabilities to the distribution:
-    for page in prob:
-        prob[page] += random
+    for other in prob:
+        prob[other] += random
 
-        if page in corpus[page]:
-            prob[page] += link
+        if other in corpus[page]:
+            prob[other] += link
 
     return prob
 
@@ -88,31 +285,140 @@ def sample_pagerank(corpus, damping_factor, n):
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    # first, not choose any page
-    estimatedPageRank = {}
-    pages = list(corpus.keys())
+    matrix = TransitionMatrix(corpus)
+    rng = np.random.default_rng(random.getrandbits(64))
+    return matrix.ranks(surf(matrix, damping_factor, n, rng) / n)
 
-    firstChoose = random.choice(pages)
-    for page in pages:
-        estimatedPageRank[page] = 0
 
-    estimatedPageRank[firstChoose] = 1 / n
+def surf(matrix, damping_factor, n, rng):
+    """
+    Return how many times each page of a TransitionMatrix is visited
+    by one random surfer taking `n` samples, starting at a random page.
 
-    currentModel = transition_model(corpus, firstChoose, damping_factor)
-    for i in range(1, n):
-        # choose one page
-        currentChoose = random.choices(
-            list(currentModel.keys()), list(currentModel.values()), k=1
-        )[0]
+    Random numbers are drawn from `rng` in batches, and each step only
+    looks up the links of the current page.
+    """
+    starts = matrix.linkptr.tolist()
+    links = matrix.links.tolist()
+    page = int(rng.integers(matrix.size))
+    visits = []
+    for begin in range(0, n, BATCH):
+        size = min(BATCH, n - begin)
+        follows = (rng.random(size) < damping_factor).tolist()
+        choices = rng.random(size).tolist()
+        jumps = rng.integers(matrix.size, size=size).tolist()
+        for follow, choice, jump in zip(follows, choices, jumps):
+            visits.append(page)
+            start, end = starts[page], starts[page + 1]
+            if follow and start < end:
+                page = links[start + int(choice * (end - start))]
+            else:
+                page = jump
+    return np.bincount(visits, minlength=matrix.size)
+
+
+def surf_batch(matrix, damping_factor, steps, walkers, rng, burn_in=0):
+    """
+    Return how many times each page of a TransitionMatrix is visited
+    by `walkers` independent random surfers taking `steps` samples each,
+    starting at random pages. All surfers move together, one step at
+    a time, and the first `burn_in` steps of each are not counted.
+    """
+    degrees = np.diff(matrix.linkptr)
+    pages = rng.integers(matrix.size, size=walkers)
+    counts = np.zeros(matrix.size, dtype=np.int64)
+    chunk = max(1, BATCH // walkers)
+    for begin in range(-burn_in, steps, chunk):
+        size = min(chunk, steps - begin)
+        visits = np.empty((size, walkers), dtype=np.int64)
+        for step in range(size):
+            visits[step] = pages
+            pageDegrees = degrees[pages]
+            follow = (rng.random(walkers) < damping_factor) & (pageDegrees > 0)
+            offsets = (rng.random(walkers) * pageDegrees).astype(np.int64)
+            nextPages = rng.integers(matrix.size, size=walkers)
+            nextPages[follow] = matrix.links[
+                matrix.linkptr[pages[follow]] + offsets[follow]
+            ]
+            pages = nextPages
+        counted = visits[max(0, -begin):]
+        counts += np.bincount(counted.ravel(), minlength=matrix.size)
+    return counts
+
+
+def parallel_pagerank(corpus, damping_factor, n, processes=None, tasks=None,
+                      seed=None):
+    """
+    Return PageRank values for each page estimated from about `n` samples
+    by random surfers spread over a pool of processes, along with a 95%
+    confidence interval for each value.
+
+    The samples are split into `tasks` equal runs of up to WALKERS
+    surfers, each with its own random number stream spawned from `seed`,
+    and each surfer first takes BURN_IN steps that are not counted.
+    The intervals come from how much the estimates of separate runs
+    vary. Return a dictionary of estimated values, and a dictionary
+    mapping each page to a (low, high) pair.
+    """
+    matrix = TransitionMatrix(corpus)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if tasks is None:
+        # Enough runs for the spread of their estimates to be normal
+        tasks = max(32, 4 * processes)
+    tasks = max(2, tasks)
+
+    # Fewer, longer walks when there are few samples, so that
+    # the steps not counted stay a small part of each run
+    samples = max(1, -(-n // tasks))
+    walkers = max(1, min(WALKERS, samples // (20 * BURN_IN)))
+    steps = -(-samples // walkers)
+    streams = np.random.SeedSequence(seed).spawn(tasks)
+
+    # Sums of each run's estimates, and of their squares
+    total = np.zeros(matrix.size)
+    squares = np.zeros(matrix.size)
+    with ProcessPoolExecutor(max_workers=processes, initializer=start_worker,
+                             initargs=(matrix,)) as executor:
+        runs = executor.map(
+            sample_run, streams, [damping_factor] * tasks,
+            [steps] * tasks, [walkers] * tasks
+        )
+        for counts in runs:
+            estimate = counts / (steps * walkers)
+            total += estimate
+            squares += estimate ** 2
+
+    mean = total / tasks
+    variance = np.maximum(squares / tasks - mean ** 2, 0)
+    variance *= tasks / (tasks - 1)
+    margin = 1.96 * np.sqrt(variance / tasks)
+    intervals = zip(
+        np.maximum(mean - margin, 0).tolist(), (mean + margin).tolist()
+    )
+    return matrix.ranks(mean), dict(zip(matrix.pages, intervals))
+
+
+def start_worker(matrix):
+    """
+    Keep the TransitionMatrix in a worker process for later runs.
+    """
+    worker["matrix"] = matrix
 
-        estimatedPageRank[currentChoose] = estimatedPageRank[currentChoose] + 1 / n
-        # next
-        currentModel = transition_model(corpus, firstChoose, damping_factor)
 
-    return estimatedPageRank
+def sample_run(stream, damping_factor, steps, walkers):
+    """
+    Return visit counts of `walkers` surfers taking `steps` samples each
+    over the worker's TransitionMatrix, drawing from a SeedSequence.
+    """
+    rng = np.random.default_rng(stream)
+    return surf_batch(
+        worker["matrix"], damping_factor, steps, walkers, rng, BURN_IN
+    )
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, method="jacobi",
+                     tolerance=0.001, callback=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -120,33 +426,435 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    See `power_iterate` for the methods, `tolerance` and `callback`.
+    """
+    matrix = TransitionMatrix(corpus)
+    return matrix.ranks(power_iterate(
+        matrix, damping_factor, tolerance, method=method, callback=callback
+    ))
+
+
+def update_pagerank(corpus, damping_factor, ranks, changes,
+                    tolerance=1e-9):
+    """
+    Return PageRank values for each page after the links of some pages
+    have changed, starting from `ranks`, the PageRank values from
+    before the change, which should have converged well.
+
+    `changes` maps each page whose links changed to the set of pages
+    it used to link to. The difference the change makes is pushed out
+    from those pages along links, page by page, until no page has more
+    than `tolerance` left to pass on, so that only pages the change
+    reaches are visited.
+
+    If pages were added or removed, every rank changes, and the ranks
+    are instead found by iterating from the old ranks.
+    """
+    n = len(corpus)
+    if len(ranks) != n or any(page not in ranks for page in corpus):
+        matrix = TransitionMatrix(corpus)
+        start = np.array([
+            ranks.get(page, (1 - damping_factor) / n) for page in matrix.pages
+        ])
+        return matrix.ranks(power_iterate(
+            matrix, damping_factor, tolerance, start / start.sum()
+        ))
+
+    ranks = dict(ranks)
+
+    # Rank each page is owed, and rank owed to every page evenly
+    # by pages with no links
+    residuals = dict()
+    spread = 0
+    for page, oldLinks in changes.items():
+        for links, sign in [(corpus[page], 1), (oldLinks, -1)]:
+            mass = sign * damping_factor * ranks[page]
+            if not links:
+                spread += mass
+                continue
+            for link in links:
+                residuals[link] = residuals.get(link, 0) + mass / len(links)
+
+    queue = collections.deque(
+        page for page in residuals if abs(residuals[page]) > tolerance
+    )
+    while queue:
+        page = queue.popleft()
+        residual = residuals.pop(page, 0)
+        if abs(residual) <= tolerance:
+            continue
+        ranks[page] += residual
+        links = corpus[page]
+        if not links:
+            spread += damping_factor * residual
+            continue
+        share = damping_factor * residual / len(links)
+        for link in links:
+            before = residuals.get(link, 0)
+            residuals[link] = before + share
+            if abs(before) <= tolerance < abs(before + share):
+                queue.append(link)
+
+    # Rank owed evenly to every page adds to every page in proportion
+    # to its rank, which rescaling to a total of 1 settles at once
+    if abs(spread) / (1 - damping_factor) > tolerance:
+        scale = 1 / (1 - spread / (1 - damping_factor))
+        ranks = {page: rank * scale for page, rank in ranks.items()}
+    return ranks
+
+
+def power_iterate(matrix, damping_factor, tolerance=0.001, start=None,
+                  method="jacobi", callback=None):
+    """
+    Return the PageRank vector for a TransitionMatrix, starting from
+    `start`, or equal ranks, and updating ranks until the ranks of all
+    pages together change by no more than `tolerance`.
+
+    A page with no links is treated as linking to every page in the
+    corpus, including itself.
+
+    `method` is one of METHODS:
+        "jacobi" updates every page at once from the previous ranks.
+        "gauss-seidel" updates pages in BLOCKS blocks, each block
+            using the ranks already updated in earlier blocks.
+        "aitken" and "quadratic" update as "jacobi", and every
+            EXTRAPOLATE iterations jump ahead by extrapolating from
+            the last three or four iterates, if that lowers the change
+            in ranks of the next step.
+
+    If given, `callback` is called after every iteration with the
+    iteration number, the change in ranks and the seconds taken so far.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method: {method!r}")
+
+    ranks = np.full(matrix.size, 1 / matrix.size) if start is None else start
+    history = []
+    ahead = None
+    begin = time.perf_counter()
+    iteration = 0
+    while True:
+        iteration += 1
+        if ahead is not None:
+            newRanks = ahead
+            ahead = None
+        elif method == "gauss-seidel":
+            newRanks = gauss_seidel_step(matrix, damping_factor, ranks)
+        else:
+            newRanks = jacobi_step(matrix, damping_factor, ranks)
+        residual = np.abs(newRanks - ranks).sum()
+        ranks = newRanks
+        if callback is not None:
+            callback(iteration, residual, time.perf_counter() - begin)
+        if residual <= tolerance:
+            return ranks
+
+        if method in ["aitken", "quadratic"]:
+            history = history[-3:] + [ranks]
+            if iteration % EXTRAPOLATE == 0 and len(history) == 4:
+                # Only jump if the step from there changes ranks less
+                # than the last one did; the step is reused either way
+                candidate = extrapolate(history, method)
+                step = jacobi_step(matrix, damping_factor, candidate)
+                if np.abs(step - candidate).sum() < residual:
+                    ranks = candidate
+                    ahead = step
+
+
+def personalized_pagerank(corpus, damping_factor, personalizations,
+                          tolerance=0.001):
+    """
+    Return a list of PageRank values for each page, one dictionary for
+    each personalization, solved together over one TransitionMatrix.
+
+    A personalization is either a dictionary mapping pages to weights,
+    or a collection of pages weighted equally. Rather than to a page
+    chosen from the whole corpus, the random surfer jumps to a page
+    chosen by those weights, both with probability 1 - damping_factor
+    and from pages with no links.
+
+    All the rank vectors are updated at once, as the columns of one
+    matrix, until none of them changes by more than `tolerance`.
     """
-    currentRanks = {}
-    for page in corpus:
-        currentRanks[page] = 1 / len(corpus)
+    matrix = TransitionMatrix(corpus)
+    index = {page: i for i, page in enumerate(matrix.pages)}
+    teleports = np.zeros((matrix.size, len(personalizations)))
+    for column, personalization in enumerate(personalizations):
+        if not isinstance(personalization, dict):
+            personalization = dict.fromkeys(personalization, 1)
+        for page, weight in personalization.items():
+            teleports[index[page], column] = weight
+    totals = teleports.sum(axis=0)
+    if np.any(totals <= 0):
+        raise ValueError("every personalization needs a page with weight")
+    teleports /= totals
+
+    ranks = teleports.copy()
     while True:
-        newRanks = {}
-        for page in currentRanks:
-            newRanks[page] = (1 - damping_factor) / len(currentRanks)
-            # links of page
-            sigma = 0
-            for link in list(corpus[page]):
-                # alway add to 1 because link could be empty
-                sigma += currentRanks[link] / (len(corpus[link]) + 1)
-            # include itself
-            # alway add to 1 because page could be empty
-            sigma += currentRanks[page] / (len(corpus[page]) + 1)
-
-            newRanks[page] += damping_factor * sigma
-
-        countChangesMore = 0
-        for page in newRanks:
-            if abs(newRanks[page] - currentRanks[page]) <= 0.001:
-                countChangesMore += 1
-        currentRanks = newRanks
-        if countChangesMore == len(currentRanks):
+        dangling = ranks[matrix.dangling].sum(axis=0)
+        newRanks = (
+            (1 - damping_factor + damping_factor * dangling) * teleports
+            + damping_factor * matrix.dot(ranks)
+        )
+        residuals = np.abs(newRanks - ranks).sum(axis=0)
+        ranks = newRanks
+        if np.all(residuals <= tolerance):
+            return [matrix.ranks(column) for column in ranks.T]
+
+
+def local_pagerank(corpus, damping_factor, seed, epsilon=1e-6):
+    """
+    Return approximate PageRank values personalized to a single page,
+    `seed`, found by pushing rank out from the seed along links
+    without visiting pages it does not reach.
+
+    Each page holds back rank it has yet to pass on until that is more
+    than `epsilon` per link, so every estimate is slightly low. Only
+    pages given some rank appear in the dictionary returned.
+    """
+    ranks = dict()
+    residuals = {seed: 1}
+    queue = collections.deque([seed])
+    while queue:
+        page = queue.popleft()
+        residual = residuals.pop(page, 0)
+        links = corpus[page]
+        if residual <= epsilon * max(len(links), 1):
+            if residual:
+                residuals[page] = residual
+            continue
+        ranks[page] = ranks.get(page, 0) + (1 - damping_factor) * residual
+
+        # From a page with no links, the surfer goes back to the seed
+        targets = links if links else [seed]
+        share = damping_factor * residual / len(targets)
+        for link in targets:
+            before = residuals.get(link, 0)
+            residuals[link] = before + share
+            threshold = epsilon * max(len(corpus[link]), 1)
+            if before <= threshold < before + share:
+                queue.append(link)
+    return ranks
+
+
+def mmap_pagerank(path, damping_factor, tolerance=0.001, directory=None):
+    """
+    Return PageRank values for each page of an edge list saved by
+    `save_edges`, iterating as "jacobi" in `power_iterate` does,
+    without loading the links or ranks into memory.
+
+    Links are read from the memory-mapped edge list EDGES at a time.
+    Ranks are kept in memory-mapped arrays of 64-bit floats in
+    `directory`, which is created if need be. The result is left there
+    in a file named "ranks", belonging to the caller, and returned as
+    a memory-mapped array; the other files used are removed. With no
+    `directory`, a temporary one is used and removed, and the ranks
+    are returned as an array in memory. Ranks are in the order of the
+    pages in `path` + ".pages".
+    """
+    if directory is None:
+        with tempfile.TemporaryDirectory() as scratch:
+            return np.array(mmap_pagerank(
+                path, damping_factor, tolerance, directory=scratch
+            ))
+    os.makedirs(directory, exist_ok=True)
+
+    with open(path + ".pages") as f:
+        n = sum(1 for line in f)
+    if os.path.getsize(path):
+        edges = np.memmap(path, dtype="<u4", mode="r").reshape(-1, 2)
+    else:
+        edges = np.zeros((0, 2), dtype="<u4")
+
+    def array(name, dtype, mode="w+"):
+        return np.memmap(os.path.join(directory, name), dtype=dtype,
+                         mode=mode, shape=(max(n, 1),))[:n]
+
+    degrees = array("degrees", np.int64)
+    for start in range(0, len(edges), EDGES):
+        np.add.at(degrees, edges[start:start + EDGES, 0], 1)
+
+    ranks = array("ranks0", np.float64)
+    newRanks = array("ranks1", np.float64)
+    names = ["ranks0", "ranks1"]
+    ranks[:] = 1 / n
+    while True:
+        dangling = sum(
+            ranks[start:start + EDGES][degrees[start:start + EDGES] == 0].sum()
+            for start in range(0, n, EDGES)
+        )
+        newRanks[:] = (1 - damping_factor) / n + damping_factor * dangling / n
+        for start in range(0, len(edges), EDGES):
+            sources = edges[start:start + EDGES, 0]
+            np.add.at(
+                newRanks, edges[start:start + EDGES, 1],
+                damping_factor * ranks[sources] / degrees[sources]
+            )
+        residual = sum(
+            np.abs(newRanks[start:start + EDGES]
+                   - ranks[start:start + EDGES]).sum()
+            for start in range(0, n, EDGES)
+        )
+        ranks, newRanks = newRanks, ranks
+        names.reverse()
+        if residual <= tolerance:
             break
-    return currentRanks
+
+    # Keep only the final ranks, under a name that does not depend on
+    # how many iterations were needed
+    ranks.flush()
+    del degrees, ranks, newRanks
+    os.replace(os.path.join(directory, names[0]),
+               os.path.join(directory, "ranks"))
+    for name in ["degrees", names[1]]:
+        os.remove(os.path.join(directory, name))
+    return array("ranks", np.float64, mode="r+")
+
+
+def jacobi_step(matrix, damping_factor, ranks):
+    """
+    Return the ranks after every page takes the rank it is given
+    by `ranks` at once.
+    """
+    n = matrix.size
+    dangling = ranks[matrix.dangling].sum()
+    return (1 - damping_factor) / n + damping_factor * (
+        matrix.dot(ranks) + dangling / n
+    )
+
+
+def gauss_seidel_step(matrix, damping_factor, ranks):
+    """
+    Return the ranks after updating pages a block at a time, so that
+    later blocks take rank from pages already updated.
+    """
+    n = matrix.size
+    ranks = ranks.copy()
+    dangling = ranks[matrix.dangling].sum()
+    bounds = np.linspace(0, n, min(BLOCKS, n) + 1).astype(np.int64)
+    for low, high in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        block = (1 - damping_factor) / n + damping_factor * (
+            matrix.dot(ranks, low, high) + dangling / n
+        )
+        dangling += (block - ranks[low:high])[matrix.dangling[low:high]].sum()
+        ranks[low:high] = block
+
+    # Updating in place does not keep the total at 1, and rescaling
+    # removes what would otherwise be the slowest error to die away
+    return ranks / ranks.sum()
+
+
+def extrapolate(history, method):
+    """
+    Return an estimate of the ranks iteration is heading for, from
+    the last four iterates in `history`.
+
+    "aitken" applies Aitken's delta-squared process to each page's
+    last three ranks. "quadratic" fits the last four iterates with
+    a quadratic in the iteration matrix, as Kamvar et al. do.
+    """
+    if method == "aitken":
+        x0, x1, x2 = history[-3:]
+        second = x2 - 2 * x1 + x0
+        safe = np.abs(second) > 1e-15
+        ranks = x2.copy()
+        ranks[safe] -= (x2 - x1)[safe] ** 2 / second[safe]
+    else:
+        x0, x1, x2, x3 = history
+        y = np.column_stack([x1 - x0, x2 - x0])
+        gamma, _, _, _ = np.linalg.lstsq(y, -(x3 - x0), rcond=None)
+        g1, g2 = gamma
+        ranks = (g1 + g2 + 1) * x1 + (g2 + 1) * x2 + x3
+
+    # Extrapolation can overshoot; fall back on the last iterate
+    ranks = np.maximum(ranks, 0)
+    total = ranks.sum()
+    if not np.isfinite(total) or total <= 0:
+        return history[-1]
+    return ranks / total
+
+
+class TransitionMatrix():
+    """
+    Links of a corpus as a sparse matrix in compressed sparse row form.
+
+    Pages are numbered in the order of the corpus. Row i lists the pages
+    that link to page i, in `indices[indptr[i]:indptr[i + 1]]`, each
+    weighted by one over the number of links on that page, so that
+    multiplying by a vector of ranks gives the rank each page receives
+    by following links.
+
+    The links on page i are also kept in `links[linkptr[i]:linkptr[i + 1]]`,
+    for a random surfer to pick from.
+    """
+
+    def __init__(self, corpus):
+        self.pages = list(corpus)
+        self.size = len(self.pages)
+        index = {page: i for i, page in enumerate(self.pages)}
+
+        degrees = np.fromiter(
+            (len(corpus[page]) for page in self.pages),
+            dtype=np.int64, count=self.size
+        )
+        sources = np.repeat(np.arange(self.size), degrees)
+        targets = np.fromiter(
+            (index[link] for page in self.pages for link in corpus[page]),
+            dtype=np.int64, count=int(degrees.sum())
+        )
+
+        self.links = targets
+        self.linkptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(degrees, out=self.linkptr[1:])
+
+        # Group links by the page they point to
+        order = np.argsort(targets, kind="stable")
+        self.indices = sources[order]
+        self.indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(targets, minlength=self.size), out=self.indptr[1:]
+        )
+        self.weights = 1 / degrees[self.indices]
+        self.dangling = degrees == 0
+
+    def dot(self, ranks, low=0, high=None):
+        """
+        Return the rank each page receives from the pages linking to it,
+        for pages numbered from `low` up to `high`.
+
+        `ranks` may also be a matrix with a column of ranks for each of
+        several rank vectors, giving a matrix of results. Its rows are
+        then taken ROWS at a time, so that the products for each link
+        fit in cache.
+        """
+        if high is None:
+            high = self.size
+        if ranks.ndim > 1 and high - low > ROWS:
+            return np.concatenate([
+                self.dot(ranks, start, min(start + ROWS, high))
+                for start in range(low, high, ROWS)
+            ])
+        result = np.zeros((high - low,) + ranks.shape[1:])
+        first, last = self.indptr[low], self.indptr[high]
+        if first == last:
+            return result
+        weights = self.weights[first:last].reshape(
+            (-1,) + (1,) * (ranks.ndim - 1)
+        )
+        contributions = ranks[self.indices[first:last]] * weights
+        starts = self.indptr[low:high] - first
+        linked = starts < self.indptr[low + 1:high + 1] - first
+        result[linked] = np.add.reduceat(
+            contributions.T, starts[linked], axis=-1
+        ).T
+        return result
+
+    def ranks(self, vector):
+        """
+        Return a dictionary mapping each page to its value in `vector`.
+        """
+        return dict(zip(self.pages, vector.tolist()))
 
 
 if __name__ == "__main__":